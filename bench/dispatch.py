@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Startup and dispatch benchmark of `cmd`.
+
+Synthetic lib dirs with the requested numbers of subcommands (every
+`--alias-every`-th one also gets a symlink alias) are generated next to a
+copy of `cmd` and `cmdutil`, then the latency and peak RSS of
+
+* `cmd --help`            (help, full discovery),
+* `cmd ‹name› --help`     (subcommand help),
+* `cmd ‹name›`            (dispatch and execute),
+* `cmd ‹alias›`           (dispatch through an alias)
+
+are measured both cold (no bytecode, no subcommand index) and warm.
+
+Results are printed as a table to stderr and written as JSON to stdout
+(or `--output`), so runs can be stored and compared over time:
+
+    bench/dispatch.py --sizes 10,100,1000 --output before.json
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+LIB_DIR = "cmd-lib"
+ENVIRONMENT = ["CMD_TRACE", "CMD_SERVER", "CMD_PATH"]  # removed for the runs
+
+SUBCOMMAND_TEMPLATE = '''\
+#!/usr/bin/env python3
+"""
+Synthetic subcommand number {number}.
+
+Generated by bench/dispatch.py.
+"""
+
+import sys
+
+import cmdutil
+
+
+class {class_name}(cmdutil.Subcommand):
+    def configure_parser(self, parser):
+        parser.add_argument("names", nargs="*", help="names")
+        parser.add_argument("-c", "--count", type=int, default=1, help="count")
+
+    def execute(self):
+        return 0
+
+
+if __name__ == "__main__":
+    {class_name}().run(sys.argv)
+'''
+
+
+def subcommand_name(number):
+    return f"sub-{number:04d}"
+
+
+def alias_name(number):
+    return f"s{number:04d}"
+
+
+def generate_tree(directory, size, alias_every):
+    """create `cmd` with `size` synthetic subcommands in `directory`"""
+    shutil.copy2(str(ROOT / "cmd"), str(directory / "cmd"))
+    lib_path = directory / LIB_DIR
+    shutil.copytree(
+        str(ROOT / LIB_DIR / "cmdutil"),
+        str(lib_path / "cmdutil"),
+        ignore=shutil.ignore_patterns("__pycache__"),
+    )
+    for number in range(size):
+        path = lib_path / f"cmd-{subcommand_name(number)}.py"
+        path.write_text(
+            SUBCOMMAND_TEMPLATE.format(number=number, class_name=f"Sub{number:04d}")
+        )
+        if alias_every and number % alias_every == 0:
+            (lib_path / f"cmd-{alias_name(number)}.py").symlink_to(path.name)
+    return directory / "cmd"
+
+
+def make_cold(directory, cache_home):
+    for pycache in directory.rglob("__pycache__"):
+        shutil.rmtree(str(pycache), ignore_errors=True)
+    shutil.rmtree(str(cache_home), ignore_errors=True)
+
+
+def measure(command, env):
+    """wall time (seconds) and peak RSS (KiB) of a single run"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    if not os.WIFEXITED(status) or os.WEXITSTATUS(status) != 0:
+        raise RuntimeError(f"{command} failed with status {status}")
+    return elapsed, usage.ru_maxrss
+
+
+def scenarios(size, alias_every):
+    middle = size // 2
+    yield "help", ["--help"]
+    yield "subcommand-help", [subcommand_name(middle), "--help"]
+    yield "run", [subcommand_name(middle)]
+    if alias_every > 0:
+        yield "alias", [alias_name(0)]
+
+
+def bench_size(size, arguments):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="cmd-bench-") as temp:
+        directory = pathlib.Path(temp)
+        cache_home = directory / "cache"
+        command = generate_tree(directory, size, arguments.alias_every)
+        env = dict(
+            os.environ,
+            XDG_CACHE_HOME=str(cache_home),
+            XDG_CONFIG_HOME=str(directory / "config"),  # no search path config
+        )
+        for variable in ENVIRONMENT:
+            env.pop(variable, None)
+        for scenario, args in scenarios(size, arguments.alias_every):
+            for mode in ["cold", "warm"]:
+                timings = []
+                peak_rss = 0
+                if mode == "warm":
+                    measure([sys.executable, str(command)] + args, env)
+                for _ in range(arguments.repeat):
+                    if mode == "cold":
+                        make_cold(directory, cache_home)
+                    elapsed, rss = measure([sys.executable, str(command)] + args, env)
+                    timings.append(elapsed)
+                    peak_rss = max(peak_rss, rss)
+                results.append(
+                    {
+                        "size": size,
+                        "scenario": scenario,
+                        "mode": mode,
+                        "runs": len(timings),
+                        "min_ms": min(timings) * 1000,
+                        "median_ms": statistics.median(timings) * 1000,
+                        "mean_ms": statistics.mean(timings) * 1000,
+                        "max_rss_kb": peak_rss,
+                    }
+                )
+    return results
+
+
+def git_revision():
+    completed = subprocess.run(
+        ["git", "-C", str(ROOT), "rev-parse", "HEAD"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        encoding="utf-8",
+    )
+    return completed.stdout.strip() if completed.returncode == 0 else None
+
+
+def print_table(results):
+    print(
+        f"{'size':>6} {'scenario':<16} {'mode':<5} "
+        f"{'min ms':>8} {'median ms':>10} {'rss KiB':>8}",
+        file=sys.stderr,
+    )
+    for r in results:
+        print(
+            f"{r['size']:6d} {r['scenario']:<16} {r['mode']:<5} "
+            f"{r['min_ms']:8.1f} {r['median_ms']:10.1f} {r['max_rss_kb']:8d}",
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument(
+        "--sizes",
+        default="10,100,1000",
+        help="comma separated numbers of subcommands (default: 10,100,1000)",
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=10, help="runs per measurement"
+    )
+    parser.add_argument(
+        "--alias-every",
+        type=int,
+        default=5,
+        help="create an alias for every n-th subcommand (0: none)",
+    )
+    parser.add_argument("-o", "--output", help="write JSON results to the file")
+    arguments = parser.parse_args()
+
+    results = []
+    for size in (int(size) for size in arguments.sizes.split(",")):
+        results += bench_size(size, arguments)
+    print_table(results)
+    report = {
+        "benchmark": "dispatch",
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": results,
+    }
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
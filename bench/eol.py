@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark of `cmd eol` (`cmdutil.eol`).
+
+Files of the requested sizes are generated for every newline mix:
+
+* `lf`, `crlf`, `cr`  pure line endings,
+* `mixed`            all three kinds interleaved,
+* `boundary`         CRs at the very end of every read chunk, followed by
+                     LF (a CRLF split between chunks) or by text,
+
+and the throughput (MB/s, best of `--repeat` runs) and Python peak memory
+(`tracemalloc`, a separate run) of
+
+* `stats`    counting (`eol -s`),
+* `convert`  conversion to LF of a fresh copy (`eol -u`),
+* `noop`     conversion to LF of a file already converted,
+* `check`    verification of LF (`eol --check`)
+
+are measured. Results of `stats`, `convert` (to LF and to CRLF) and
+`check`, run directly and through the stat cache entries (with and
+without a cached entry), are compared with the reference implementation
+of `Eol.stat_path` / `Eol.process` preceding the chunked engine, for
+files up to `--verify-limit` (the reference reads whole files and loops
+over bytes in Python).
+
+Generated files are usually in the page cache, so the figures show the
+processing cost rather than the disk speed. Results are printed as a
+table to stderr and written as JSON to stdout (or `--output`):
+
+    bench/eol.py --sizes 4K,1M,64M --output before.json
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "cmd-lib"))
+
+from cmdutil import eol  # noqa: E402
+
+MIXES = ["lf", "crlf", "cr", "mixed", "boundary"]
+OPERATIONS = ["stats", "convert", "noop", "check"]
+UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+LINE = b"The quick brown fox jumps over the lazy dog 0123456789"
+
+
+def reference_stat(text):
+    """`(nix, mac, dos)` as counted by the original per-byte loop"""
+    nix = 0
+    mac = 0
+    dos = 0
+    cr = False
+    for byte in text:
+        if cr:
+            if byte == 0x0A:
+                dos += 1
+            else:
+                mac += 1
+        else:
+            if byte == 0x0A:
+                nix += 1
+        cr = byte == 0x0D
+    if cr:
+        mac += 1
+    return (nix, mac, dos)
+
+
+def reference_endings(text):
+    """yield names (`nix`, `mac`, `dos`) of the line endings of `text`"""
+    cr = False
+    for byte in text:
+        if cr:
+            yield "dos" if byte == 0x0A else "mac"
+        elif byte == 0x0A:
+            yield "nix"
+        cr = byte == 0x0D
+    if cr:
+        yield "mac"
+
+
+def reference_violation(text, separator):
+    """`(line, kind)` of the first line ending other than `separator`"""
+    name = eol.SEPARATORS[separator]
+    for line, kind in enumerate(reference_endings(text), 1):
+        if kind != name:
+            return line, kind
+    return None
+
+
+def reference_convert(text, separator):
+    """`text` converted by the original chain of replaces"""
+    out_text = text.replace(b"\r\n", b"\n")
+    out_text = out_text.replace(b"\r", b"\n")
+    if separator != b"\n":
+        out_text = out_text.replace(b"\n", separator)
+    return out_text
+
+
+def parse_size(text):
+    text = text.strip().upper().rstrip("B")
+    unit = text[-1:] if text[-1:] in UNITS else ""
+    return int(float(text[: len(text) - len(unit)]) * UNITS[unit])
+
+
+def blocks(mix):
+    """repeating blocks of a newline `mix`, each `eol.CHUNK_SIZE` long"""
+    size = eol.CHUNK_SIZE
+    if mix == "boundary":
+        # A|B: CR followed by text, B|A: CRLF split between chunks
+        body = LINE + b"\r\n" + LINE + b"\r" + LINE + b"\n"
+        a = (b"\n" + body * (size // len(body) + 1))[: size - 1] + b"\r"
+        b = (b"x" + body * (size // len(body) + 1))[: size - 1] + b"\r"
+        return [a, b]
+    endings = {
+        "lf": [b"\n"],
+        "crlf": [b"\r\n"],
+        "cr": [b"\r"],
+        "mixed": [b"\n", b"\r\n", b"\r", b"\r\n"],
+    }[mix]
+    body = b"".join(LINE + ending for ending in endings)
+    return [(body * (size // len(body) + 1))[:size]]
+
+
+def generate(path, mix, size):
+    pattern = blocks(mix)
+    with open(path, "wb") as f:
+        written = 0
+        index = 0
+        while written < size:
+            block = pattern[index % len(pattern)][: size - written]
+            f.write(block)
+            written += len(block)
+            index += 1
+
+
+def operation(name, path, work_path):
+    """`(setup, run)` callables of the operation `name` on `path`"""
+    if name == "stats":
+        return None, lambda: eol.stat_path(str(path))
+    if name == "check":
+        return None, lambda: eol.first_violation(str(work_path), b"\n")
+    if name == "noop":
+        return None, lambda: eol.convert(str(work_path), b"\n")
+    return (
+        lambda: shutil.copyfile(str(path), str(work_path)),
+        lambda: eol.convert(str(work_path), b"\n"),
+    )
+
+
+def timed(setup, run):
+    if setup:
+        setup()
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+def peak_memory(setup, run):
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def verify_cached(path, work_path, text, separator):
+    """whether the stat cache entry functions match the reference"""
+    counts = reference_stat(text)
+    violation = reference_violation(text, separator) or False
+    converted = reference_convert(text, separator)
+    shutil.copyfile(str(path), str(work_path))
+    result, entry = eol.stat_entry((str(work_path), None))
+    if result != counts or eol.stat_entry((str(work_path), entry))[0] != counts:
+        return False
+    for cached in [None, entry]:
+        if eol.check_entry((str(work_path), cached), separator)[0] != violation:
+            return False
+    changed, entry = eol.convert_entry((str(work_path), entry), separator)
+    if changed != (converted != text) or read(work_path) != converted:
+        return False
+    for cached in [None, entry]:
+        changed, _ = eol.convert_entry((str(work_path), cached), separator)
+        if changed or read(work_path) != converted:
+            return False
+        if eol.check_entry((str(work_path), cached), separator)[0] is not False:
+            return False
+    return True
+
+
+def verify(path, work_path, limit):
+    """whether the engine matches the reference, `None` if not checked"""
+    if os.path.getsize(path) > limit:
+        return None
+    text = read(path)
+    if eol.stat_path(str(path)) != reference_stat(text):
+        return False
+    for separator in [b"\n", b"\r\n"]:
+        if eol.first_violation(str(path), separator) != reference_violation(
+            text, separator
+        ):
+            return False
+        shutil.copyfile(str(path), str(work_path))
+        eol.convert(str(work_path), separator)
+        if read(work_path) != reference_convert(text, separator):
+            return False
+        if not verify_cached(path, work_path, text, separator):
+            return False
+    return True
+
+
+def bench_file(directory, mix, size, arguments):
+    path = directory / f"{mix}-{size}.txt"
+    work_path = directory / f"{mix}-{size}.work"
+    generate(path, mix, size)
+    verified = verify(path, work_path, arguments.verify_limit)
+    results = []
+    for name in arguments.operations.split(","):
+        shutil.copyfile(str(path), str(work_path))
+        eol.convert(str(work_path), b"\n")  # conforming, for `noop` / `check`
+        setup, run = operation(name, path, work_path)
+        timings = [timed(setup, run) for _ in range(arguments.repeat)]
+        best = min(timings)
+        results.append(
+            {
+                "mix": mix,
+                "size": size,
+                "operation": name,
+                "runs": len(timings),
+                "best_s": best,
+                "mb_per_s": size / best / 1e6 if best else None,
+                "peak_memory": peak_memory(setup, run),
+                "verified": verified,
+            }
+        )
+    path.unlink()
+    work_path.unlink()
+    return results
+
+
+def git_revision():
+    completed = subprocess.run(
+        ["git", "-C", str(ROOT), "rev-parse", "HEAD"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        encoding="utf-8",
+    )
+    return completed.stdout.strip() if completed.returncode == 0 else None
+
+
+def print_table(results):
+    print(
+        f"{'size':>11} {'mix':<9} {'operation':<8} "
+        f"{'MB/s':>9} {'peak KiB':>9} {'verified':>8}",
+        file=sys.stderr,
+    )
+    for r in results:
+        mb_per_s = f"{r['mb_per_s']:9.1f}" if r["mb_per_s"] else f"{'-':>9}"
+        print(
+            f"{r['size']:11d} {r['mix']:<9} {r['operation']:<8} "
+            f"{mb_per_s} {r['peak_memory'] // 1024:9d} {str(r['verified']):>8}",
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument(
+        "--sizes",
+        default="4K,1M,64M",
+        help="comma separated file sizes, with K / M / G suffixes "
+        "(default: 4K,1M,64M)",
+    )
+    parser.add_argument(
+        "--mixes",
+        default=",".join(MIXES),
+        help=f"comma separated newline mixes (default: {','.join(MIXES)})",
+    )
+    parser.add_argument(
+        "--operations",
+        default=",".join(OPERATIONS),
+        help=f"comma separated operations (default: {','.join(OPERATIONS)})",
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=5, help="runs per measurement"
+    )
+    parser.add_argument(
+        "--verify-limit",
+        type=parse_size,
+        default=parse_size("16M"),
+        help="largest file compared with the reference (default: 16M)",
+    )
+    parser.add_argument(
+        "-d", "--directory", help="directory for generated files (default: temp)"
+    )
+    parser.add_argument("-o", "--output", help="write JSON results to the file")
+    arguments = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(
+        prefix="eol-bench-", dir=arguments.directory
+    ) as temp:
+        for size in (parse_size(size) for size in arguments.sizes.split(",")):
+            for mix in arguments.mixes.split(","):
+                results += bench_file(pathlib.Path(temp), mix, size, arguments)
+    print_table(results)
+    report = {
+        "benchmark": "eol",
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "chunk_size": eol.CHUNK_SIZE,
+        "results": results,
+    }
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if any(r["verified"] is False for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
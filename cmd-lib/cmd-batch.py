@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Run many subcommand invocations in a single process.
+
+Every line of the input (a file, or stdin) is an invocation, split like a
+shell would do it, e.g.:
+
+    eol -s src
+    eol -u "file with spaces.txt"
+
+Empty lines and `#` comments are ignored. With `--null`, invocations are
+separated by NUL characters instead of newlines.
+
+Subcommand modules are imported once and reused. With `--jobs`,
+invocations run in parallel workers and the output of every invocation
+is printed as a whole, in input order. The exit code is the highest exit
+code of the invocations.
+"""
+
+import pathlib
+import sys
+
+import cmdutil
+import cmdutil.batch
+from cmdutil import metadata
+
+
+class Batch(cmdutil.Subcommand):
+    def configure_parser(self, parser):
+        parser.add_argument(
+            "file", nargs="?", default="-", help="invocations (default: stdin)"
+        )
+        parser.add_argument(
+            "-0",
+            "--null",
+            action="store_true",
+            help="invocations are separated by NUL instead of newline",
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help="number of parallel workers (0: one per CPU, default: 1)",
+        )
+
+    def validate_arguments(self):
+        if self.arguments.jobs < 0:
+            self.arguments_error("number of jobs cannot be negative")
+
+    def execute(self):
+        command_path = sys.argv[0]
+        command = cmdutil.Command(
+            command_path,
+            metadata.module_docstring(command_path),
+            pathlib.Path(__file__).parent,
+        )
+        if self.arguments.file == "-":
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(self.arguments.file, "r")
+            except OSError as e:
+                self.error(f"cannot read `{self.arguments.file}`: {e.strerror}")
+        with stream:
+            invocations = cmdutil.batch.read_invocations(stream, self.arguments.null)
+            return cmdutil.batch.run(command, invocations, self.arguments.jobs)
+
+
+if __name__ == "__main__":
+    Batch().run(sys.argv)
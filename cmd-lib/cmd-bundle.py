@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Bundle the command and all subcommands into a single executable file.
+
+The bundle is a zip application with precompiled bytecode and a prebuilt
+subcommand index, so starting it opens one file instead of scanning the
+lib directory. Deploy it instead of `cmd` and `cmd-lib`, e.g.:
+
+    cmd bundle /shared/bin/cmd
+
+The bytecode matches the Python version running this command; other
+versions fall back to the bundled sources.
+"""
+
+import pathlib
+import sys
+
+import cmdutil
+import cmdutil.bundle
+from cmdutil import metadata
+
+
+class Bundle(cmdutil.Subcommand):
+    def configure_parser(self, parser):
+        parser.add_argument("output", help="bundle file to create")
+        parser.add_argument(
+            "-p",
+            "--python",
+            default="/usr/bin/env python3",
+            help="interpreter of the bundle (default: `/usr/bin/env python3`)",
+        )
+        parser.add_argument(
+            "-z", "--compress", action="store_true", help="compress bundled files"
+        )
+
+    def execute(self):
+        command_path = sys.argv[0]
+        lib_path = pathlib.Path(__file__).parent
+        if cmdutil.bundle.find(lib_path):
+            self.error("cannot bundle a bundle")
+        docstring = metadata.module_docstring(command_path)
+        command = cmdutil.Command(command_path, docstring, lib_path)
+        try:
+            subcommands = cmdutil.bundle.build(
+                command,
+                self.arguments.output,
+                self.arguments.python,
+                docstring,
+                compressed=self.arguments.compress,
+            )
+        except OSError as e:
+            self.error(f"cannot create `{self.arguments.output}`: {e}")
+        if self.arguments.verbose:
+            print(f"bundled {len(subcommands)} subcommands")
+
+
+if __name__ == "__main__":
+    Bundle().run(sys.argv)
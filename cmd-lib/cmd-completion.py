@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Print shell completion script of the command.
+
+Enable completion of subcommands, options and their choices, e.g. in
+`~/.bashrc`:
+
+    eval "$(cmd completion bash)"
+
+or in `~/.zshrc` (after `compinit`):
+
+    eval "$(cmd completion zsh)"
+
+Completion data of every subcommand is cached on first use, and rebuilt
+when the subcommand changes; `--refresh` builds all of it in advance.
+"""
+
+import os
+import pathlib
+import sys
+
+import cmdutil
+import cmdutil.completion
+from cmdutil import dispatch
+
+
+class Completion(cmdutil.Subcommand):
+    def configure_parser(self, parser):
+        parser.add_argument(
+            "shell",
+            nargs="?",
+            choices=sorted(cmdutil.completion.SHELLS),
+            help="shell to print the script for",
+        )
+        parser.add_argument(
+            "-r",
+            "--refresh",
+            action="store_true",
+            help="build completion data of all subcommands",
+        )
+
+    def validate_arguments(self):
+        if not self.arguments.shell and not self.arguments.refresh:
+            self.arguments_error("shell is required")
+
+    def _refresh(self):
+        command_path = sys.argv[0]
+        lib_paths = dispatch.search_path(command_path, pathlib.Path(__file__).parent)
+        names = cmdutil.completion.subcommand_names(command_path, lib_paths)
+        for name in sorted(names):
+            spec = cmdutil.completion.subcommand_spec(command_path, lib_paths, name)
+            if self.arguments.verbose:
+                print(f"{name}: {'ok' if spec else 'no completion data'}")
+
+    def execute(self):
+        if self.arguments.refresh:
+            self._refresh()
+        if self.arguments.shell:
+            command_name = os.path.basename(sys.argv[0])
+            print(cmdutil.completion.script(self.arguments.shell, command_name), end="")
+
+
+if __name__ == "__main__":
+    Completion().run(sys.argv)
@@ -15,6 +15,7 @@ import subprocess
 import sys
 
 import cmdutil
+from cmdutil import dispatch
 
 
 class Edit(cmdutil.Subcommand):
@@ -26,6 +27,10 @@ class Edit(cmdutil.Subcommand):
         self_path = pathlib.Path(__file__)
         prefix = re.split(r"-|_", self_path.name)[0]
         name = "-".join([prefix] + subcommand_tokens)
+        for directory in dispatch.search_path(sys.argv[0], self_path.parent):
+            path = pathlib.Path(directory, name + ".py")
+            if path.is_file():
+                return path
         return pathlib.Path(self_path.parent, name + ".py")
 
     def validate_arguments(self):
@@ -3,18 +3,71 @@
 Converts eols to desirable os standard.
 
 The command supports both direct filenames and glob templates. It also translates directories into template for their content.
+
+Directories (with `--recursive`, whole trees) are walked lazily, so work
+starts with the first file. Hidden files, binary files (unless
+`--binary`), directories like `.git` or `node_modules` and paths ignored
+by `.gitignore` files (unless `--no-ignore`) are skipped.
+
+With `--jobs`, files are processed by parallel workers; results are
+still printed in order, as soon as they are available. A file which
+cannot be processed is reported, and the command goes on with the rest
+(and exits with code 1).
+
+With `--cache` (or `CMD_EOL_CACHE=1` in the environment), counts and
+conformity of files are cached per working directory, and files which
+did not change (size, mtime, inode) since the previous run are not read
+again. `--no-cache` disables the cache, `--rebuild-cache` discards it.
+
+With `--check`, files are not converted: the first line ending of every
+file which does not match the wanted one (`-u` by default) is reported
+as `path:line: kind`, and the command exits with code 1 if there is any.
+Scanning of a file stops at its first offending line ending, and with
+`--fail-fast`, the whole run stops at the first offending file.
+
+With `--tracked`, `--staged` or `--since REF`, the files are listed by
+git (tracked files, staged files, or files changed since `REF`), and
+filenames, if any, limit the listing (as git pathspecs).
+
+Filename `-` reads file names from stdin, one per line. In a pipeline
+(`cmd pipe`), the command reads paths from the upstream stage, and
+produces statistics records (with `-s`), offending paths (with
+`--check`) or converted paths.
 """
 
-import glob
+import collections
+import functools
 import os
 import sys
 
 import cmdutil
+import cmdutil.cache
+import cmdutil.eol
+import cmdutil.utils
+import cmdutil.walk
+
+BATCH_SIZE = 32  # files per task of a worker
+CACHE_VARIABLE = "CMD_EOL_CACHE"
+
+
+class EolStats(collections.namedtuple("EolStats", "path nix mac dos")):
+    def __str__(self):
+        return f"{self.nix: 6d} {self.mac: 6d} {self.dos: 6d}  {self.path}"
+
+
+class EolViolation(collections.namedtuple("EolViolation", "path line kind")):
+    def __str__(self):
+        return f"{self.path}:{self.line}: {self.kind}"
 
 
 class Eol(cmdutil.Subcommand):
+    consumes = "path"
+    produces = "path"
+
     def configure_parser(self, parser):
-        parser.add_argument("filenames", nargs="+", help="files to convert")
+        parser.add_argument(
+            "filenames", nargs="*", help="files to convert (`-` reads stdin)"
+        )
         group = parser.add_mutually_exclusive_group()
         group.add_argument(
             "-u",
@@ -44,82 +97,238 @@ class Eol(cmdutil.Subcommand):
             default=False,
             help="print statistics about used eols",
         )
+        parser.add_argument(
+            "-c",
+            "--check",
+            action="store_true",
+            help="report files with other line endings instead of converting",
+        )
+        parser.add_argument(
+            "--fail-fast",
+            action="store_true",
+            help="stop at the first offending file (implies `--check`)",
+        )
+        git_group = parser.add_mutually_exclusive_group()
+        git_group.add_argument(
+            "--tracked", action="store_true", help="files tracked by git"
+        )
+        git_group.add_argument(
+            "--staged", action="store_true", help="files staged in git"
+        )
+        git_group.add_argument(
+            "--since",
+            metavar="REF",
+            help="files changed (in git) since `REF`, e.g. `origin/main`",
+        )
+        parser.add_argument(
+            "-r",
+            "--recursive",
+            action="store_true",
+            help="process directories recursively",
+        )
+        parser.add_argument(
+            "--exclude-dir",
+            action="append",
+            default=[],
+            metavar="DIR",
+            help="skip directories of this name (in addition to "
+            f"{', '.join(cmdutil.walk.EXCLUDED_DIRS)})",
+        )
+        parser.add_argument(
+            "--no-ignore",
+            action="store_true",
+            help="do not skip paths ignored by `.gitignore` files",
+        )
+        parser.add_argument(
+            "--binary", action="store_true", help="do not skip binary files"
+        )
+        cache_group = parser.add_mutually_exclusive_group()
+        cache_group.add_argument(
+            "--cache",
+            action="store_true",
+            help=f"skip files unchanged since the previous run (or ${CACHE_VARIABLE})",
+        )
+        cache_group.add_argument(
+            "--no-cache", action="store_true", help="do not use the cache"
+        )
+        cache_group.add_argument(
+            "--rebuild-cache",
+            action="store_true",
+            help="discard the cache, and build it again",
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help="number of parallel workers (0: one per CPU, default: 1)",
+        )
 
-    def generate_paths(self, filenames):
-        paths = set()
-        for filename in filenames:
+    def _git(self):
+        return self.arguments.tracked or self.arguments.staged or self.arguments.since
+
+    def validate_arguments(self):
+        if not self.arguments.filenames and self.upstream is None and not self._git():
+            self.arguments_error("the following arguments are required: filenames")
+        if self.arguments.jobs < 0:
+            self.arguments_error("number of jobs cannot be negative")
+        self.arguments.check = self.arguments.check or self.arguments.fail_fast
+        if self.arguments.check and self.arguments.stats:
+            self.arguments_error("argument -s/--stats: not allowed with --check")
+        self.failures = 0
+        self.violations = 0
 
-            if os.path.isdir(filename):
-                pattern = os.path.join(filename, "*")
+    def _filenames(self):
+        for filename in self.arguments.filenames:
+            if filename == "-":
+                yield from (line.rstrip("\n") for line in sys.stdin if line.strip())
             else:
-                pattern = filename
-            paths.update(glob.glob(pattern, recursive=True))
-        return sorted(p for p in paths if not os.path.isdir(p))
+                yield filename
+
+    def _paths(self):
+        upstream = self.upstream_records()
+        if upstream is not None and not self.arguments.filenames:
+            return (str(path) for path in upstream)
+        if self._git():
+            return self.git_paths(list(self._filenames()))
+        return self.generate_paths(self._filenames())
+
+    def git_paths(self, pathspecs):
+        if self.arguments.tracked:
+            paths = cmdutil.utils.git_tracked_files(pathspecs)
+        else:
+            paths = cmdutil.utils.git_changed_files(self.arguments.since, pathspecs)
+        return (path for path in paths if os.path.isfile(path))  # no submodules
+
+    def generate_paths(self, filenames):
+        walker = cmdutil.walk.Walker(
+            excluded_dirs=cmdutil.walk.EXCLUDED_DIRS + self.arguments.exclude_dir,
+            gitignore=not self.arguments.no_ignore,
+            skip_binary=False,  # sniffed (and cached) by workers
+            recursive=self.arguments.recursive,
+        )
+        return walker.expand(filenames)
 
     def stat_path(self, path):
-        with open(path, "rb") as f:
-            text = f.read()
-        nix = 0
-        mac = 0
-        dos = 0
-        cr = False
-        for byte in text:
-            if cr:
-                if byte == 0x0A:
-                    dos += 1
-                else:
-                    mac += 1
-            else:
-                if byte == 0x0A:
-                    nix += 1
-            cr = byte == 0x0D
-        if cr:
-            mac += 1
-        return (nix, mac, dos)
+        return cmdutil.eol.stat_path(path)
 
     def process(self, path, separator):
-        with open(path, "rb") as f:
-            text = f.read()
+        return cmdutil.eol.convert(path, separator)
+
+    def _separator(self):
+        if self.arguments.mac:
+            return b"\r"
+        elif self.arguments.dos:
+            return b"\r\n"
+        else:
+            return b"\n"
 
-        out_text = text.replace(b"\r\n", b"\n")
-        out_text = out_text.replace(b"\r", b"\n")
-        if separator != b"\n":
-            out_text = out_text.replace(b"\n", separator)
+    def _report(self, path, e):
+        self.failures += 1
+        print(f"cannot process `{path}`: {e.strerror or e}", file=sys.stderr)
 
-        if text == out_text:
+    def _map(self, function, items):
+        """yield `(path, result)` of `(path, ...)` items, skipping failed ones"""
+        if self.arguments.jobs == 1:
+            for item in items:
+                try:
+                    yield item[0], function(item)
+                except OSError as e:
+                    self._report(item[0], e)
             return
+        import cmdutil.parallel  # slow to import, only for `--jobs`
 
-        with open(path, "wb") as f:
-            f.write(out_text)
+        batches = cmdutil.parallel.batched(items, BATCH_SIZE)
+        call_each = functools.partial(cmdutil.parallel.call_each, function)
+        with cmdutil.parallel.executor(self.arguments.jobs) as pool:
+            for batch, future in cmdutil.parallel.imap(pool, call_each, batches):
+                for item, (result, error) in zip(batch, future.result()):
+                    if error is None:
+                        yield item[0], result
+                    elif isinstance(error, OSError):
+                        self._report(item[0], error)
+                    else:
+                        raise error
 
-    def execute(self):
+    def _stat_cache(self):
         arguments = self.arguments
-        paths = self.generate_paths(arguments.filenames)
-        if arguments.stats:
+        if arguments.no_cache:
+            return None
+        if not (arguments.cache or arguments.rebuild_cache):
+            if os.getenv(CACHE_VARIABLE, "") in ["", "0"]:
+                return None
+        command = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        cache_path = cmdutil.cache.cache_path(
+            command, "eol", os.path.realpath(os.getcwd())
+        )
+        return cmdutil.eol.StatCache(cache_path, rebuild=arguments.rebuild_cache)
+
+    def _entries(self):
+        """`(path, entry)` of all paths, `entry` is `None` without cache"""
+        stat_cache = self._stat_cache()
+        if stat_cache is None:
+            return None, ((path, None) for path in self._paths())
+        return stat_cache, ((path, stat_cache.get(path)) for path in self._paths())
+
+    def _function(self):
+        skip_binary = not self.arguments.binary
+        if self.arguments.stats:
+            return functools.partial(cmdutil.eol.stat_entry, skip_binary=skip_binary)
+        function = cmdutil.eol.convert_entry
+        if self.arguments.check:
+            function = cmdutil.eol.check_entry
+        return functools.partial(
+            function, separator=self._separator(), skip_binary=skip_binary
+        )
+
+    def _record(self, path, result):
+        if self.arguments.stats:
+            return EolStats(path, *result)
+        if self.arguments.check:
+            self.violations += 1
+            return EolViolation(path, *result)
+        return path
+
+    def records(self):
+        stat_cache, items = self._entries()
+        try:
+            for path, (result, entry) in self._map(self._function(), items):
+                if stat_cache is not None:
+                    stat_cache.update(path, entry)
+                if result is None:
+                    continue  # binary
+                if result is False and self.arguments.check:
+                    continue  # conforms
+                yield self._record(path, result)
+                if self.violations and self.arguments.fail_fast:
+                    break
+        finally:
+            if stat_cache is not None:
+                stat_cache.save()
+
+    def execute(self):
+        if self.arguments.stats:
             print("   nix    mac    dos    path")
             print("-" * 32)
             n = 0
             m = 0
             d = 0
             files = 0
-            for path in paths:
-                nix, mac, dos = self.stat_path(path)
-                print(f"{nix: 6d} {mac: 6d} {dos: 6d}  {path}")
-                n += nix
-                m += mac
-                d += dos
+            for stats in self.records():
+                print(stats)
+                n += stats.nix
+                m += stats.mac
+                d += stats.dos
                 files += 1
             print("-" * 32)
             print(f"{n: 6d} {m: 6d} {d: 6d}  total in {files} files")
+        elif self.arguments.check:
+            for violation in self.records():
+                print(violation)
         else:
-            if arguments.mac:
-                separator = b"\r"
-            elif arguments.dos:
-                separator = b"\r\n"
-            else:
-                separator = b"\n"
-            for path in paths:
-                self.process(path, separator)
+            for _ in self.records():
+                pass
+        return 1 if self.failures or self.violations else 0
 
 
 if __name__ == "__main__":
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Filter pipeline records by their fields.
+
+Every condition has the form `FIELD OP VALUE`, where OP is one of `==`,
+`!=`, `<`, `<=`, `>`, `>=` or `~` (regular expression search). A record
+passes if all the conditions hold. Numeric fields are compared as
+numbers, e.g.:
+
+    cmd pipe eol -s . \\| filter 'dos>0' 'path~\\.py$' \\| eol -u
+
+Run alone, the command filters lines of stdin (any field name refers to
+the whole line).
+"""
+
+import operator
+import re
+import sys
+
+import cmdutil
+from cmdutil.subcommand import record_field
+
+CONDITION = re.compile(r"^\s*(\w+)\s*(==|!=|<=|>=|<|>|~)\s*(.*?)\s*$")
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+class Filter(cmdutil.Subcommand):
+    consumes = "*"
+    produces = "*"
+
+    def configure_parser(self, parser):
+        parser.add_argument("conditions", nargs="+", help="conditions `FIELD OP VALUE`")
+
+    def validate_arguments(self):
+        self.conditions = []
+        for condition in self.arguments.conditions:
+            match = CONDITION.match(condition)
+            if not match:
+                self.arguments_error(f"invalid condition `{condition}`")
+            field, op, value = match.groups()
+            if op == "~":
+                try:
+                    value = re.compile(value)
+                except re.error as e:
+                    self.arguments_error(f"invalid expression `{value}`: {e}")
+            self.conditions.append((field, op, value))
+
+    def _matches(self, record):
+        for field, op, value in self.conditions:
+            actual = record_field(record, field)
+            if op == "~":
+                if not value.search(str(actual)):
+                    return False
+                continue
+            if isinstance(actual, (int, float)):
+                try:
+                    value = float(value)
+                except ValueError:
+                    self.error(f"`{field}` is numeric, cannot compare with `{value}`")
+            else:
+                actual = str(actual)
+            if not OPERATORS[op](actual, value):
+                return False
+        return True
+
+    def records(self):
+        upstream = self.upstream_records()
+        if upstream is None:
+            upstream = (line.rstrip("\n") for line in sys.stdin)
+        for record in upstream:
+            if self._matches(record):
+                yield record
+
+    def execute(self):
+        for record in self.records():
+            print(record)
+
+
+if __name__ == "__main__":
+    Filter().run(sys.argv)
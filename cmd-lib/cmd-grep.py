@@ -5,15 +5,78 @@ Run grep, ignoring irrelevant dirs.
 Note on parameters:
 * it is easier to control colors using command's option
 * if switches need to be passed to grep, one can use `--`
+
+With `--engine native`, files are searched by the command itself, in
+parallel workers (`--jobs`): directories are walked recursively, skipping
+directories like `.git` or `node_modules`, paths ignored by `.gitignore`
+files and binary files, and every file is memory-mapped and searched
+with a compiled regular expression. Output is in the order of the walk.
+Only the grep switches `-i`, `-n`, `-l`, `-w` and `-e PATTERN` are
+supported, and patterns are Python regular expressions (which agree with
+grep's for plain text and common constructs). The exit code is 0 if a
+line matched, 1 if none did, and 2 on errors.
+
+`--index build` creates a trigram index of the files under the working
+directory (in the cache directory; files as walked by the native engine).
+While it exists, every native search updates it (files changed since are
+read again) and searches only the files which can match. Patterns
+without literals of three or more characters, switches other than the
+natively supported ones, or explicit paths make the search go on without
+the index. git grep and grep never use it: they search files the walk
+skips (ignored ones, `node_modules`), and their patterns are not Python
+regular expressions. `--index update` updates it, `--index stats` shows
+its size, and `--skip-index` ignores it.
+
+With `--root DIR` (repeatable) and / or `--repos` (every git repository
+found under the roots, or under the working directory: nested repos and
+submodules included), one `git grep` runs per repository, up to `--jobs`
+at a time. Output lines are prefixed with the path of their repository,
+and are printed as they come, in the order of the roots (`--order
+ordered`, default) or as the searches produce them (`--order
+completed`). The exit code is 2 if any search failed, else 0 if any
+matched, else 1.
 """
 
 import argparse
+import functools
+import os
+import queue
+import re
 import subprocess
 import sys
 
 import cmdutil
+import cmdutil.cache
+import cmdutil.gitdir
+import cmdutil.parallel
+import cmdutil.search
+import cmdutil.trigram
+import cmdutil.walk
 
 EXCLUDED_DIRS = [".git", ".idea"]
+ENGINES = ["git", "grep", "native"]
+BATCH_SIZE = 32  # files per task of a worker
+NATIVE_SWITCHES = {
+    "i": "ignore_case",
+    "n": "line_number",
+    "l": "files_only",
+    "w": "word",
+}
+NATIVE_LONG_SWITCHES = {
+    "--ignore-case": "ignore_case",
+    "--line-number": "line_number",
+    "--files-with-matches": "files_only",
+    "--word-regexp": "word",
+}
+COLORS = {
+    "path": b"\x1b[35m",
+    "separator": b"\x1b[36m",
+    "line": b"\x1b[32m",
+    "match": b"\x1b[1;31m",
+}
+RESET = b"\x1b[0m"
+INDEX_ACTIONS = ["build", "update", "stats"]
+ORDERS = ["ordered", "completed"]
 
 
 class Grep(cmdutil.Subcommand):
@@ -26,22 +89,399 @@ class Grep(cmdutil.Subcommand):
             default=None,
             help="use ANSI colors in output",
         )
-        parser.add_argument(
+        engine_group = parser.add_mutually_exclusive_group()
+        engine_group.add_argument(
             "-g",
             "--grep",
             action="store_true",
             help="use grep directly (instead of git grep)",
         )
+        engine_group.add_argument(
+            "--engine",
+            choices=ENGINES,
+            default=None,
+            help="search with git grep (default), grep, or natively",
+        )
         parser.add_argument(
             "-p", "--pager", action="store_true", help="enable paging of results"
         )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=0,
+            help="number of parallel workers of the native engine and of "
+            "indexing (0: one per CPU, default)",
+        )
+        index_group = parser.add_mutually_exclusive_group()
+        index_group.add_argument(
+            "--index",
+            choices=INDEX_ACTIONS,
+            help="build, update or show statistics of the trigram index of "
+            "the working directory, instead of searching",
+        )
+        index_group.add_argument(
+            "--skip-index",
+            action="store_true",
+            help="do not use the trigram index of the working directory",
+        )
+        parser.add_argument(
+            "--root",
+            action="append",
+            default=[],
+            metavar="DIR",
+            help="search the repository at `DIR` (repeatable)",
+        )
+        parser.add_argument(
+            "--repos",
+            action="store_true",
+            help="search every git repository under the roots (or under "
+            "the working directory)",
+        )
+        parser.add_argument(
+            "--order",
+            choices=ORDERS,
+            default="ordered",
+            help="print results of repositories in the order of the roots "
+            "(default), or as completed",
+        )
         parser.unknown_args_name = "grep_args"
 
+    def validate_arguments(self):
+        if self.arguments.jobs < 0:
+            self.arguments_error("number of jobs cannot be negative")
+        if self.arguments.engine is None:
+            self.arguments.engine = "grep" if self.arguments.grep else "git"
+        if self.arguments.root or self.arguments.repos:
+            if self.arguments.engine != "git":
+                self.arguments_error("`--root` and `--repos` search with git grep")
+            if self.arguments.index:
+                self.arguments_error("`--index` is not allowed with `--root`")
+        self.failures = 0
+
+    def native_options(self, grep_args):
+        """
+        the grep switches, patterns and paths of `grep_args`
+
+        Raises `ValueError` if `grep_args` are not supported natively.
+        """
+        options = argparse.Namespace(
+            patterns=[], paths=[], **{name: False for name in NATIVE_SWITCHES.values()}
+        )
+        args = iter(grep_args)
+        positionals = []
+        for arg in args:
+            if arg == "--":
+                positionals += args
+            elif arg in NATIVE_LONG_SWITCHES:
+                setattr(options, NATIVE_LONG_SWITCHES[arg], True)
+            elif arg == "--regexp" or arg.startswith("--regexp="):
+                options.patterns.append(
+                    arg[len("--regexp=") :] if "=" in arg else next(args, None)
+                )
+            elif arg.startswith("-") and len(arg) > 1:
+                for i, switch in enumerate(arg[1:], 1):
+                    if switch == "e":
+                        options.patterns.append(arg[i + 1 :] or next(args, None))
+                        break
+                    if switch not in NATIVE_SWITCHES:
+                        raise ValueError(
+                            f"switch `{arg}` is not supported by the native engine"
+                        )
+                    setattr(options, NATIVE_SWITCHES[switch], True)
+            else:
+                positionals.append(arg)
+        if None in options.patterns:
+            raise ValueError("switch `-e` expects a pattern")
+        if not options.patterns:
+            if not positionals:
+                raise ValueError("a pattern is required")
+            options.patterns.append(positionals.pop(0))
+        options.paths = positionals
+        return options
+
+    def _color(self):
+        if self.arguments.color:
+            return self.arguments.color[:1] == "a"
+        return sys.stdout.isatty()
+
+    def _report(self, path, e):
+        self.failures += 1
+        print(f"cannot search `{path}`: {e.strerror or e}", file=sys.stderr)
+
+    def _map(self, function, paths):
+        """yield `(path, result)` of `paths`, skipping failed ones"""
+        if self.arguments.jobs == 1:
+            for path in paths:
+                try:
+                    yield path, function(path)
+                except OSError as e:
+                    self._report(path, e)
+            return
+        batches = cmdutil.parallel.batched(paths, BATCH_SIZE)
+        call_each = functools.partial(cmdutil.parallel.call_each, function)
+        with cmdutil.parallel.executor(self.arguments.jobs) as pool:
+            for batch, future in cmdutil.parallel.imap(pool, call_each, batches):
+                for path, (result, error) in zip(batch, future.result()):
+                    if error is None:
+                        yield path, result
+                    elif isinstance(error, OSError):
+                        self._report(path, error)
+                    else:
+                        raise error
+
+    def native_paths(self, paths):
+        """files to search: `paths` expanded like `grep -r` does"""
+        walker = cmdutil.walk.Walker(
+            skip_binary=False,  # sniffed by workers
+            hidden=True,
+        )
+        if paths:
+            return walker.expand(paths)
+        prefix = "." + os.sep
+        return (path[len(prefix) :] for path in walker.expand(["."]))
+
+    def execute_native(self, candidates=None):
+        try:
+            options = self.native_options(self.arguments.grep_args)
+        except ValueError as e:
+            self.arguments_error(str(e))
+        try:
+            regex = cmdutil.search.compile_patterns(
+                options.patterns, options.ignore_case, options.word
+            )
+        except re.error as e:
+            self.error(f"invalid pattern: {e}", returncode=2)
+        colors = COLORS if self._color() else {}
+        reset = RESET if colors else b""
+        path_start = colors.get("path", b"")
+        separator = colors.get("separator", b"") + b":" + reset
+        line_start = colors.get("line", b"")
+        match_start = colors.get("match", b"")
+        names = len(options.paths) != 1 or not os.path.isfile(options.paths[0])
+        function = functools.partial(
+            cmdutil.search.search_path, regex=regex, files_only=options.files_only
+        )
+        out = sys.stdout.buffer
+        matched = False
+        paths = self.native_paths(options.paths) if candidates is None else candidates
+        results = self._map(function, paths)
+        try:
+            for path, lines in results:
+                if not lines:
+                    continue  # no match, or binary
+                matched = True
+                name = path_start + os.fsencode(path) + reset
+                if options.files_only:
+                    out.write(name + b"\n")
+                    continue
+                for line_number, line in lines:
+                    prefix = name + separator if names else b""
+                    if options.line_number:
+                        prefix += line_start + b"%d" % line_number + reset + separator
+                    line = cmdutil.search.highlight(line, regex, match_start, reset)
+                    out.write(prefix + line + b"\n")
+            out.flush()
+        except BrokenPipeError:
+            # the reader is gone (like `| head`): stop quietly, and keep the
+            # final flush at exit from failing again
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+            os.close(devnull)
+            return 0
+        finally:
+            results.close()
+        if self.failures:
+            return 2
+        return 0 if matched else 1
+
+    def _index(self, create=False):
+        """trigram index of the working directory, `None` if there is none"""
+        command = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        db_path = cmdutil.cache.cache_path(
+            command, "grep-index", os.path.realpath(os.getcwd())
+        ).with_suffix(".sqlite")
+        if not create and not db_path.exists():
+            return None
+        return cmdutil.trigram.TrigramIndex(str(db_path))
+
+    def _update_index(self, index):
+        """update `index`, returns the walked paths"""
+        paths = list(self.native_paths([]))
+        index.update(paths, functools.partial(self._map, cmdutil.trigram.file_trigrams))
+        return paths
+
+    def index_candidates(self):
+        """
+        files which may match (in the walk order), according to the trigram
+        index; `None` if the index cannot narrow the native search
+
+        Only the native engine uses the index: the other ones search files
+        the walk skips, and their (basic regular expression) patterns
+        would need a guard against syntax Python reads differently.
+        """
+        if self.arguments.skip_index or "--" in self.arguments.grep_args:
+            return None
+        try:
+            options = self.native_options(self.arguments.grep_args)
+            regex = cmdutil.search.compile_patterns(
+                options.patterns, options.ignore_case, options.word
+            )
+        except (ValueError, re.error):
+            return None
+        if options.paths:
+            return None
+        alternatives = cmdutil.trigram.required_trigrams(regex)
+        if alternatives is None:
+            return None
+        index = self._index()
+        if index is None:
+            return None
+        try:
+            paths = self._update_index(index)
+            found = index.candidates(alternatives)
+        finally:
+            index.close()
+        candidates = [path for path in paths if path in found]
+        if self.arguments.verbose:
+            print(f"index: {len(candidates)} of {len(paths)} files", flush=True)
+        return candidates
+
+    def execute_index(self):
+        index = self._index(create=self.arguments.index != "stats")
+        if index is None:
+            self.error(f"no index of `{os.getcwd()}`", returncode=1)
+        try:
+            if self.arguments.index == "build":
+                index.clear()
+            if self.arguments.index != "stats":
+                self._update_index(index)
+            for name, value in index.stats().items():
+                print(f"{name}: {value}")
+        finally:
+            index.close()
+        return 2 if self.failures else 0
+
+    def _in_repository(self, directory):
+        try:
+            return cmdutil.gitdir.discover(directory) is not None
+        except (cmdutil.gitdir.Unsupported, OSError):
+            return True  # let git decide
+
+    def repositories(self, roots):
+        """yield `roots` and, with `--repos`, git repositories under them"""
+        seen = set()
+        for root in roots:
+            directories = [root]
+            while directories:
+                directory = directories.pop()
+                real_path = os.path.realpath(directory)
+                if real_path in seen:
+                    continue
+                seen.add(real_path)
+                if not self.arguments.repos:
+                    yield directory
+                    continue
+                try:
+                    with os.scandir(directory) as it:
+                        entries = sorted(it, key=lambda entry: entry.name)
+                except OSError:
+                    continue
+                if any(entry.name == ".git" for entry in entries):
+                    yield directory
+                elif directory == root and self._in_repository(root):
+                    yield directory
+                directories += reversed(
+                    [
+                        entry.path
+                        for entry in entries
+                        if entry.name not in cmdutil.walk.EXCLUDED_DIRS
+                        and entry.is_dir(follow_symlinks=False)
+                    ]
+                )
+
+    def _search_root(self, index, root, command, results):
+        """
+        run `command` in `root`, putting `(index, line, None)` of its output
+        lines and finally `(index, None, returncode)` to `results`
+        """
+        returncode = 2
+        try:
+            process = subprocess.Popen(command, cwd=root, stdout=subprocess.PIPE)
+            with process.stdout:
+                for line in process.stdout:
+                    results.put((index, line, None))
+            returncode = process.wait()
+        except OSError as e:
+            print(f"cannot search `{root}`: {e.strerror or e}", file=sys.stderr)
+        finally:
+            results.put((index, None, returncode))
+
+    def _prefix(self, root, color):
+        """output prefix of lines found in `root`"""
+        relative = os.path.relpath(root)
+        if relative == ".":
+            return b""
+        prefix = os.fsencode(os.path.join(relative, ""))
+        return COLORS["path"] + prefix + RESET if color else prefix
+
+    def execute_roots(self):
+        arguments = self.arguments
+        roots = list(self.repositories(arguments.root or ["."]))
+        if arguments.verbose:
+            print("roots:", roots, flush=True)
+        color = self._color()
+        command = ["git", "--no-pager", "grep"]
+        command.append("--color=always" if color else "--color=never")
+        command += arguments.grep_args
+        prefixes = [self._prefix(root, color) for root in roots]
+        ordered = arguments.order == "ordered"
+        results = queue.Queue()
+        buffered = [[] for _ in roots]
+        done = [False for _ in roots]
+        returncodes = []
+        current = 0  # the root printed directly, if ordered
+        out = sys.stdout.buffer
+        with cmdutil.parallel.executor(arguments.jobs, processes=False) as pool:
+            for index, root in enumerate(roots):
+                pool.submit(self._search_root, index, root, command, results)
+            while len(returncodes) < len(roots):
+                index, line, returncode = results.get()
+                if line is None:
+                    returncodes.append(returncode)
+                    done[index] = True
+                elif not ordered or index == current:
+                    out.write(prefixes[index] + line)
+                else:
+                    buffered[index].append(line)
+                while ordered and current < len(roots) and done[current]:
+                    current += 1  # the next root, printing what it found so far
+                    if current < len(roots):
+                        out.writelines(
+                            prefixes[current] + line for line in buffered[current]
+                        )
+                        buffered[current] = []
+                if results.empty():
+                    out.flush()
+        out.flush()
+        if any(returncode not in (0, 1) for returncode in returncodes):
+            return 2
+        return 0 if 0 in returncodes else 1
+
     def execute(self):
         arguments = self.arguments
         if arguments.verbose:
             print("grep args:", arguments.grep_args, flush=True)
-        if arguments.grep:
+        if arguments.index:
+            return self.execute_index()
+        if arguments.root or arguments.repos:
+            return self.execute_roots()
+        if arguments.engine == "native":
+            candidates = self.index_candidates()
+            if candidates is not None and not candidates:
+                return 1
+            return self.execute_native(candidates)
+        if arguments.engine == "grep":
             command = ["grep", "-r"]
         else:
             command = ["git"]
@@ -56,7 +496,7 @@ class Grep(cmdutil.Subcommand):
         else:
             command.append("--color=auto")
         command += arguments.grep_args
-        if arguments.grep:
+        if arguments.engine == "grep":
             command += [f"--exclude-dir={dir}" for dir in EXCLUDED_DIRS]
         completed_process = subprocess.run(command)
         return completed_process.returncode
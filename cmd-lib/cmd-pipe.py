@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Run subcommands as an in-process pipeline.
+
+Stages are separated by a `|` argument (quote it for the shell), e.g.
+list files with mixed line endings, and convert them:
+
+    cmd pipe eol -s src \\| filter 'dos>0' \\| eol -u
+
+All stages run in one process and pass records (paths, statistics)
+instead of text. Every stage but the last one must produce records, and
+every stage but the first one must consume them.
+"""
+
+import argparse
+import pathlib
+import sys
+
+import cmdutil
+import cmdutil.pipeline
+from cmdutil import metadata
+
+
+class Pipe(cmdutil.Subcommand):
+    def configure_parser(self, parser):
+        parser.add_argument(
+            "pipeline",
+            nargs=argparse.REMAINDER,
+            help=f"stages separated by `{cmdutil.pipeline.SEPARATOR}`",
+        )
+
+    def validate_arguments(self):
+        if not self.arguments.pipeline:
+            self.arguments_error("pipeline is required")
+
+    def execute(self):
+        command_path = sys.argv[0]
+        command = cmdutil.Command(
+            command_path,
+            metadata.module_docstring(command_path),
+            pathlib.Path(__file__).parent,
+        )
+        stages = cmdutil.pipeline.split(self.arguments.pipeline)
+        return cmdutil.pipeline.Pipeline(command).call(stages)
+
+
+if __name__ == "__main__":
+    Pipe().run(sys.argv)
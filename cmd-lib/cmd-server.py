@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Run warm server to speed up subsequent commands.
+
+The server keeps the command framework and all subcommands imported, and
+serves every invocation of `cmd` made with `CMD_SERVER` set to its
+socket:
+
+    cmd server --socket /tmp/cmd.sock &
+    export CMD_SERVER=/tmp/cmd.sock
+    cmd eol -s .
+
+If the server is not running, `cmd` silently runs commands by itself.
+Subcommand modules are reloaded when their files change; restart the
+server after changing `cmdutil`.
+"""
+
+import os
+import pathlib
+import sys
+
+import cmdutil
+import cmdutil.server
+from cmdutil import dispatch, metadata
+
+
+class Server(cmdutil.Subcommand):
+    def configure_parser(self, parser):
+        parser.add_argument(
+            "-s",
+            "--socket",
+            default=os.getenv(dispatch.SERVER_VARIABLE),
+            help=f"socket to listen on (default: ${dispatch.SERVER_VARIABLE})",
+        )
+
+    def validate_arguments(self):
+        if not self.arguments.socket:
+            self.arguments_error(
+                f"socket is required (either `--socket` or ${dispatch.SERVER_VARIABLE})"
+            )
+
+    def execute(self):
+        command_path = sys.argv[0]
+        lib_path = pathlib.Path(__file__).parent
+        server = cmdutil.server.Server(
+            command_path,
+            metadata.module_docstring(command_path),
+            lib_path,
+            self.arguments.socket,
+        )
+        if self.arguments.verbose:
+            print(f"listening on `{self.arguments.socket}`", flush=True)
+        try:
+            server.serve()
+        except OSError as e:
+            self.error(str(e))
+
+
+if __name__ == "__main__":
+    Server().run(sys.argv)
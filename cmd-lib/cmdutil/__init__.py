@@ -1,4 +1,19 @@
-from .command import Command
-from .subcommand import Subcommand
+__all__ = ["Command", "Subcommand", "SubcommandError"]
 
-__all__ = ["Command", "Subcommand"]
+
+def __getattr__(name):
+    # the framework is imported on first use, so that fast dispatch
+    # (`cmdutil.dispatch`) does not pay for the parts it does not need
+    if name == "Command":
+        from .command import Command
+
+        return Command
+    if name == "Subcommand":
+        from .subcommand import Subcommand
+
+        return Subcommand
+    if name == "SubcommandError":
+        from .subcommand import SubcommandError
+
+        return SubcommandError
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Event loop for subcommands with `async def execute()`.
+
+`asyncio` is imported only by subcommands which need it.
+"""
+
+import asyncio
+import signal
+
+SIGNALS = [signal.SIGINT, signal.SIGTERM]
+
+
+class Runner(object):
+    """
+    runs awaitables of a single subcommand invocation on one event loop
+
+    SIGINT / SIGTERM cancel the running task; the cancellation surfaces as
+    `SystemExit` with the conventional `128 + signal` exit code.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+
+    def _add_signal_handlers(self, task, received):
+        def cancel(signum):
+            received.append(signum)
+            task.cancel()
+
+        installed = []
+        for signum in SIGNALS:
+            try:
+                self.loop.add_signal_handler(signum, cancel, signum)
+            except (ValueError, RuntimeError, NotImplementedError):
+                continue  # not the main thread, or not supported
+            installed.append(signum)
+        return installed
+
+    def run(self, awaitable):
+        task = asyncio.ensure_future(awaitable, loop=self.loop)
+        received = []
+        installed = self._add_signal_handlers(task, received)
+        try:
+            return self.loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            if received:
+                raise SystemExit(128 + received[0])
+            raise
+        finally:
+            for signum in installed:
+                self.loop.remove_signal_handler(signum)
+
+    def close(self):
+        """cancel leftover tasks and close the loop"""
+        loop = self.loop
+        try:
+            tasks = [task for task in asyncio.all_tasks(loop) if not task.done()]
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            if hasattr(loop, "shutdown_default_executor"):
+                loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            loop.close()
+
+
+if __name__ == "__main__":
+    pass
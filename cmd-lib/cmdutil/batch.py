@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Running many subcommand invocations in a single process.
+
+Every invocation goes through `Command.call()`, so subcommand modules are
+executed once and reused, and neither `sys.exit`, `error()` nor an
+exception (reported, exit code 1) ends the batch. Module-level state of a subcommand persists between invocations.
+"""
+
+import contextlib
+import io
+import shlex
+import sys
+
+from . import parallel
+from .command import Command
+from .subcommand import exit_code
+
+_command = None
+
+
+def read_invocations(stream, null=False):
+    """yield argv lists: one per line, or per NUL-terminated record"""
+    if null:
+        records = _split_null(stream)
+    else:
+        records = (line.rstrip("\n") for line in stream)
+    for record in records:
+        argv = shlex.split(record, comments=not null)
+        if argv:
+            yield argv
+
+
+def _split_null(stream):
+    rest = ""
+    for chunk in iter(lambda: stream.read(65536), ""):
+        records = (rest + chunk).split("\0")
+        rest = records.pop()
+        yield from records
+    if rest:
+        yield rest
+
+
+def call(command, argv):
+    """
+    run `argv` (without the command itself), return exit code
+
+    An exception of the invocation is reported, and its exit code is 1.
+    """
+    try:
+        return command.call([str(command.command)] + list(argv))
+    except SystemExit as e:
+        return exit_code(e)
+    except Exception as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+
+
+def _initialize(command_string, description, lib_path):
+    global _command
+    _command = Command(command_string, description, lib_path)
+
+
+def _call_captured(argv):
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        returncode = call(_command, argv)
+    return returncode, stdout.getvalue(), stderr.getvalue()
+
+
+def run(command, invocations, jobs=1):
+    """
+    run all `invocations`, return the highest exit code
+
+    With `jobs` other than 1, invocations run in a pool of forked workers;
+    output of every invocation is captured and printed, in input order,
+    once it completes. Output written directly to the file descriptors
+    (e.g. by child processes) is not captured and may interleave.
+    """
+    returncode = 0
+    if jobs == 1:
+        for argv in invocations:
+            returncode = max(returncode, call(command, argv))
+        return returncode
+    initargs = (str(command.command), command.description, str(command.lib_path))
+    with parallel.executor(jobs, initializer=_initialize, initargs=initargs) as pool:
+        for _, future in parallel.imap(pool, _call_captured, invocations):
+            code, stdout, stderr = future.result()
+            sys.stdout.write(stdout)
+            sys.stderr.write(stderr)
+            returncode = max(returncode, code)
+    sys.stdout.flush()
+    return returncode
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Single-file bundles of the command (see `cmd bundle`).
+
+A bundle is an executable zip application containing `__main__.py`, the
+`cmdutil` package and all subcommand modules, each as source and as
+precompiled (unchecked hash-based) bytecode, and a prebuilt subcommand
+index (name, alias target, description, class). The index and modules
+are read through `zipimport`, so starting a bundled command opens a
+single file instead of globbing and stat'ing the lib directory.
+
+Bytecode is specific to the Python version which built the bundle; other
+versions fall back to the bundled sources.
+"""
+
+import marshal
+import os
+import sys
+import zipimport
+
+from . import trace
+
+INDEX = "index.marshal"
+VERSION = 1
+
+MAIN_TEMPLATE = """\
+{docstring}
+import os
+import sys
+
+LIB_DIR = {lib_dir!r}
+
+
+lib_path = os.path.join(os.path.dirname(__file__), LIB_DIR)
+sys.path.insert(0, lib_path)
+from cmdutil import dispatch
+
+dispatch.run(sys.argv[0], __doc__, lib_path, sys.argv)
+"""
+
+_bundles = {}
+
+
+class Bundle(object):
+    def __init__(self, lib_path, importer):
+        self.lib_path = lib_path
+        self.importer = importer
+        data = marshal.loads(importer.get_data(importer.prefix + INDEX))
+        if data.get("version") != VERSION:
+            raise ValueError(f"unsupported bundle version {data.get('version')}")
+        self.index = data["subcommands"]
+
+    def path(self, subcommand):
+        """path of the `subcommand` inside the bundle, `None` if unknown"""
+        entry = self.index.get(subcommand)
+        return os.path.join(self.lib_path, entry["file"]) if entry else None
+
+    def load_module(self, path, subcommand):
+        """execute the bundled subcommand module (once per process)"""
+        module_name = f"subcommand.{subcommand}"
+        module = sys.modules.get(module_name)
+        if module is not None and getattr(module, "__loader__", None) is self.importer:
+            return module
+        file_name = os.path.basename(str(path))
+        code = self.importer.get_code(os.path.splitext(file_name)[0])
+        module = type(sys)(module_name)
+        module.__file__ = os.path.join(self.lib_path, file_name)
+        module.__loader__ = self.importer
+        sys.modules[module_name] = module
+        with trace.span("module", module=module_name, path=module.__file__):
+            exec(code, module.__dict__)
+        return module
+
+
+def find(lib_path):
+    """the bundle at `lib_path`, `None` if `lib_path` is not in a bundle"""
+    lib_path = str(lib_path)
+    if lib_path not in _bundles:
+        bundle = None
+        if not os.path.isdir(lib_path):
+            try:
+                bundle = Bundle(lib_path, zipimport.zipimporter(lib_path))
+            except (zipimport.ZipImportError, OSError, ValueError, KeyError):
+                pass
+        _bundles[lib_path] = bundle
+    return _bundles[lib_path]
+
+
+def _bytecode(source, file_name):
+    """unchecked hash-based pyc of the `source`"""
+    import importlib.util
+
+    code = compile(source, file_name, "exec", dont_inherit=True)
+    flags = 0b01  # hash-based, not checked against the source
+    return (
+        importlib.util.MAGIC_NUMBER
+        + flags.to_bytes(4, "little")
+        + importlib.util.source_hash(source)
+        + marshal.dumps(code)
+    )
+
+
+def _string_literal(text):
+    if '"""' in text or text.endswith("\\"):
+        return repr(text)
+    return f'"""{text}"""'
+
+
+def _add_module(archive, source_path, name):
+    with open(source_path, "rb") as f:
+        source = f.read()
+    archive.writestr(name, source)
+    archive.writestr(os.path.splitext(name)[0] + ".pyc", _bytecode(source, name))
+
+
+def build(command, output, interpreter, docstring, compressed=False):
+    """bundle the `command` (a `Command` of a lib directory) into `output`"""
+    import zipfile
+
+    lib_dir = command.lib_path.resolve().name
+    command._load_subcommands()
+    stored = {}
+    subcommands = {}
+    for subcommand, entry in sorted(
+        command.index.items(), key=lambda item: (item[1]["link"], item[0])
+    ):
+        if entry["target"] not in stored:
+            stored[entry["target"]] = (entry["file"], command.subcommands[subcommand])
+        file_name = stored[entry["target"]][0]
+        subcommands[subcommand] = dict(entry, file=file_name, target=file_name)
+
+    compression = zipfile.ZIP_DEFLATED if compressed else zipfile.ZIP_STORED
+    temp_path = f"{output}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(f"#!{interpreter}\n".encode("utf-8"))
+            with zipfile.ZipFile(f, "w", compression=compression) as archive:
+                main = MAIN_TEMPLATE.format(
+                    docstring=_string_literal(docstring), lib_dir=lib_dir
+                )
+                archive.writestr("__main__.py", main)
+                package_path = os.path.join(str(command.lib_path), "cmdutil")
+                for file_name in sorted(os.listdir(package_path)):
+                    if file_name.endswith(".py"):
+                        _add_module(
+                            archive,
+                            os.path.join(package_path, file_name),
+                            f"{lib_dir}/cmdutil/{file_name}",
+                        )
+                for file_name, source_path in sorted(stored.values()):
+                    _add_module(archive, str(source_path), f"{lib_dir}/{file_name}")
+                index = {"version": VERSION, "subcommands": subcommands}
+                archive.writestr(f"{lib_dir}/{INDEX}", marshal.dumps(index))
+        os.chmod(temp_path, 0o755)
+        os.replace(temp_path, str(output))
+        temp_path = None
+    finally:
+        if temp_path is not None:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+    return subcommands
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Persistent per-user cache files.
+
+Cache files are JSON documents stored under `$XDG_CACHE_HOME/‹command›`
+(`~/.cache/‹command›` by default). They are written atomically, and any
+failure to read or write them is silently ignored: a cache is an
+optimization, never a requirement.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+
+
+def cache_dir(command):
+    """directory for cache files of the `command`"""
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return pathlib.Path(base, command)
+
+
+def cache_path(command, kind, key):
+    """path of the `kind` cache file for the `key` (typically a directory)"""
+    digest = hashlib.sha1(str(key).encode("utf-8", "surrogateescape")).hexdigest()
+    return cache_dir(command) / f"{kind}-{digest[:16]}.json"
+
+
+def signature(stat_result):
+    """cheap change detection key of a file"""
+    return [stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino]
+
+
+def load(path):
+    """load cached data, `None` if absent or unreadable"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save(path, data):
+    """atomically replace cached data, ignoring failures"""
+    path = pathlib.Path(path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(
+            dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp"
+        )
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(temp_path, str(path))
+        return True
+    except OSError:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        return False
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Thin client of the warm `cmd` server (see `cmdutil.server`).
+
+When `CMD_SERVER` names the socket of a running server, `cmd` forwards
+argv, working directory, environment and its stdin / stdout / stderr file
+descriptors to the server and exits with the code the server reports.
+"""
+
+import _socket  # `socket` itself pulls in enum and selectors, too slow here
+import array
+import marshal
+import os
+import struct
+
+INT = struct.Struct("!i")
+
+
+def send_request(connection, request, fds):
+    payload = marshal.dumps(request)
+    data = INT.pack(len(payload)) + payload
+    ancillary = [(_socket.SOL_SOCKET, _socket.SCM_RIGHTS, array.array("i", fds))]
+    sent = connection.sendmsg([data], ancillary)
+    connection.sendall(data[sent:])
+
+
+def receive_int(connection):
+    data = b""
+    while len(data) < INT.size:
+        chunk = connection.recv(INT.size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return INT.unpack(data)[0]
+
+
+def run(socket_path, args):
+    """
+    run `args` on the server listening on `socket_path`
+
+    Returns the exit code, or `None` if no server is available (the caller
+    is expected to run the command locally then).
+    """
+    connection = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+        request = {"argv": list(args), "cwd": os.getcwd(), "env": dict(os.environ)}
+        send_request(connection, request, [0, 1, 2])
+        worker = receive_int(connection)
+    except OSError:
+        connection.close()
+        return None
+    if worker is None:
+        connection.close()
+        return None
+    try:
+        while True:
+            try:
+                returncode = receive_int(connection)
+                break
+            except KeyboardInterrupt:
+                # the worker does not share our process group; relay ^C
+                import signal
+
+                try:
+                    os.kill(worker, signal.SIGINT)
+                except OSError:
+                    pass
+    finally:
+        connection.close()
+    return 1 if returncode is None else returncode
+
+
+if __name__ == "__main__":
+    pass
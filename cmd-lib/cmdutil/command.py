@@ -4,67 +4,68 @@ Utility class for executing command.
 """
 
 import collections
-import importlib.util
 import pathlib
 import sys
 
-from .subcommand import Subcommand
+from . import bundle, cache, dispatch, metadata, trace
+from .index import SubcommandIndex
 
 
 class Command(object):
     def __init__(self, command_string, description, lib_path):
         self.command = pathlib.Path(command_string)
         self.description = description
-        self.lib_path = lib_path
+        self.lib_path = pathlib.Path(lib_path)
+        self.bundle = bundle.find(lib_path)
+        self.lib_paths = [
+            pathlib.Path(directory)
+            for directory in dispatch.search_path(command_string, lib_path)
+        ]
         self.subcommands = None
+        self.index = None
 
     def _get_subcommand_module(self, path, subcommand):
-        module_name = f"subcommand.{subcommand}"
-        spec = importlib.util.spec_from_file_location(module_name, path)
-        module = importlib.util.module_from_spec(spec)
-        sys.modules[module_name] = module
-        spec.loader.exec_module(module)
-        return module
-
-    def _get_subcommand_class(self, module):
-        for subcommand_class in vars(module).values():
-            if isinstance(subcommand_class, type) and issubclass(
-                subcommand_class, Subcommand
-            ):
-                return subcommand_class
-        return None
-
-    def _get_subcommand_description(self, path, subcommand):
+        if self.bundle and pathlib.Path(path).parent == self.lib_path:
+            return self.bundle.load_module(path, subcommand)
+        return dispatch.load_module(path, subcommand)
+
+    def _get_subcommand_class(self, module, class_name=None):
+        return dispatch.subcommand_class(module, class_name)
+
+    def _get_subcommand_metadata(self, path, subcommand):
+        extracted = metadata.extract(path)
+        if extracted is not None:
+            return extracted
         module = self._get_subcommand_module(path, subcommand)
+        subcommand_class = self._get_subcommand_class(module)
         description = (module.__doc__ or "").strip()
-        if not description:
-            subcommand_class = self._get_subcommand_class(module)
+        if not description and subcommand_class:
             description = (subcommand_class.__doc__ or "").strip()
-        return description.split("\n", 1)[0].strip()
+        class_name = subcommand_class.__name__ if subcommand_class else None
+        return description.split("\n", 1)[0].strip(), class_name
 
     def _subcommand_prefix(self):
         return f"{self.command.stem}-"
 
     def _subcommand_list(self):
         clusters = collections.defaultdict(list)
-        for subcommand, path in sorted(self.subcommands.items()):
-            resolved_path = path.resolve()
-            priority = -10 ** 10 if not path.is_symlink() else -len(subcommand)
-            clusters[resolved_path].append((priority, subcommand, path))
+        for subcommand, entry in sorted(self.index.items()):
+            priority = -(10**10) if not entry["link"] else -len(subcommand)
+            clusters[entry["target"]].append((priority, subcommand, entry))
         subcommand_list = []
         for cluster in clusters.values():
             cluster = sorted(cluster)
-            _, subcommand, path = cluster.pop(0)
+            _, subcommand, entry = cluster.pop(0)
             aliases = sorted(subcommand for _, subcommand, _ in cluster)
-            subcommand_list.append((subcommand, aliases, path))
+            subcommand_list.append((subcommand, aliases, entry))
         return sorted(subcommand_list)
 
     def _command_help(self):
         print(f"usage: {self.command.name} subcommand ...\n")
         print(self.description.strip() + "\n")
         print("available subcommands:")
-        for subcommand, aliases, path in self._subcommand_list():
-            subcommand_description = self._get_subcommand_description(path, subcommand)
+        for subcommand, aliases, entry in self._subcommand_list():
+            subcommand_description = entry["description"]
             names = subcommand
             if aliases:
                 names += f' ({", ".join(sorted(aliases))})'
@@ -76,40 +77,90 @@ class Command(object):
                 print("".ljust(column_width + 2), subcommand_description)
         print(f"\nRun `{self.command.name} ‹subcommand› --help` for more information.")
 
-    def _discover_subcommands(self):
+    def _discover_subcommands(self, root):
         prefix = self._subcommand_prefix()
-        for path in self.lib_path.glob(f"{prefix}*.py"):
+        for path in root.glob(f"{prefix}*.py"):
             yield path.stem[len(prefix) :], path
 
-    def _instantiate_subcommand(self, subcommand):
-        module = self._get_subcommand_module(self.subcommands[subcommand], subcommand)
-        subcommand_class = self._get_subcommand_class(module)
+    def _load_index(self):
+        roots = [
+            root.resolve()
+            for root in self.lib_paths
+            if not (self.bundle and root == self.lib_path)
+        ]
+        entries = {}
+        if roots:
+            index = SubcommandIndex(
+                roots,
+                cache.cache_path(self.command.stem, "index", roots),
+                self._discover_subcommands,
+                self._get_subcommand_metadata,
+            )
+            entries = index.refresh()
+        if self.bundle:
+            for subcommand, entry in self.bundle.index.items():
+                entries.setdefault(subcommand, dict(entry, root=str(self.lib_path)))
+        return entries
+
+    def _load_subcommands(self):
+        lib_paths = [str(root) for root in self.lib_paths]
+        with trace.span("discover", lib_paths=lib_paths):
+            self.index = self._load_index()
+        self.subcommands = {
+            subcommand: pathlib.Path(entry["root"], entry["file"])
+            for subcommand, entry in self.index.items()
+        }
+
+    def _locate_subcommand(self, subcommand):
+        path = dispatch.subcommand_path(self.command, self.lib_paths, subcommand)
+        if path:
+            return pathlib.Path(path)
+        if self.subcommands is None:
+            self._load_subcommands()
+        return self.subcommands.get(subcommand)
+
+    def _instantiate_subcommand(self, subcommand, path):
+        module = self._get_subcommand_module(path, subcommand)
+        entry = (self.index or {}).get(subcommand) or {}
+        subcommand_class = self._get_subcommand_class(module, entry.get("class"))
         return subcommand_class() if subcommand_class else None
 
     def _error(self, *message):
         for line in message:
             print(line)
-        sys.exit(1)
+        return 1
 
-    def run(self, args):
-        self.subcommands = dict(self._discover_subcommands())
-        if len(args) < 2 or args[1] in ["-h", "-?", "--help"]:
-            self._command_help()
-            sys.exit(0)
-        subcommand = args[1]
-        path = self.subcommands.get(subcommand)
+    def instantiate(self, subcommand):
+        """instance of the `subcommand`, `None` (reported) if unavailable"""
+        path = self._locate_subcommand(subcommand)
         if not path:
             self._error(
                 f"Unknown subcommand `{subcommand}`",
                 f"Run `{self.command.name} --help` for list of available subcommands.",
             )
-        instance = self._instantiate_subcommand(subcommand)
+            return None
+        instance = self._instantiate_subcommand(subcommand, path)
         if not instance:
             self._error(
                 f"Cannot instantiate subcommand `{subcommand}`",
                 "Did you forget to derive the class from Subcommand?",
             )
-        sys.exit(instance.run(args, subcommand=subcommand))
+            return None
+        return instance
+
+    def call(self, args):
+        """run the command, return the exit code instead of exiting"""
+        if len(args) < 2 or args[1] in dispatch.HELP_OPTIONS:
+            self._load_subcommands()
+            self._command_help()
+            return 0
+        instance = self.instantiate(args[1])
+        if not instance:
+            return 1
+        return instance.call(args, subcommand=args[1])
+
+    def run(self, args):
+        sys.exit(self.call(args))
 
 
 if __name__ == "__main__":
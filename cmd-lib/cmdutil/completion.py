@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Shell completion of subcommands and their options.
+
+`cmd --complete WORD...` prints candidates for the last (partial) word,
+one per line; `cmd completion bash|zsh` prints the shell script hooking
+it up.
+
+Subcommand names come from listing the search path directories. Options,
+their choices and mutually exclusive groups come from a spec of the
+subcommand's parser, cached per subcommand file. The spec is rebuilt (by
+importing the module once) when the file or `cmdutil.subcommand` change;
+a cached spec is read without importing `argparse`, `json` or the
+subcommand module.
+"""
+
+import marshal
+import os
+import sys
+import zlib
+
+from . import dispatch
+
+VERSION = 1
+
+BASH_TEMPLATE = """\
+_{function}() {{
+    local IFS=$'\\n'
+    COMPREPLY=($("${{COMP_WORDS[0]}}" --complete \\
+        "${{COMP_WORDS[@]:1:COMP_CWORD}}" 2>/dev/null))
+}}
+complete -o default -F _{function} {command}
+"""
+
+ZSH_TEMPLATE = """\
+#compdef {command}
+_{function}() {{
+    local -a candidates
+    candidates=("${{(@f)$("${{words[1]}}" --complete \\
+        "${{(@)words[2,CURRENT]}}" 2>/dev/null)}}")
+    if [[ -n ${{candidates[1]}} ]]; then
+        compadd -a candidates
+    else
+        _files
+    fi
+}}
+compdef _{function} {command}
+"""
+
+SHELLS = {"bash": BASH_TEMPLATE, "zsh": ZSH_TEMPLATE}
+
+
+def script(shell, command_name):
+    """completion script of the `shell` for the command `command_name`"""
+    function = "".join(c if c.isalnum() else "_" for c in command_name)
+    return SHELLS[shell].format(command=command_name, function=function)
+
+
+def _cache_dir(command_string):
+    """same directory as `cache.cache_dir()`, without its imports"""
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, dispatch.command_stem(command_string))
+
+
+def _bundle(lib_paths):
+    lib_path = str(lib_paths[-1])
+    if os.path.isdir(lib_path):
+        return None
+    from . import bundle
+
+    return bundle.find(lib_path)
+
+
+def subcommand_names(command_string, lib_paths):
+    """names of all subcommands (and aliases) on the search path"""
+    prefix = f"{dispatch.command_stem(command_string)}-"
+    names = set()
+    for lib_path in lib_paths:
+        try:
+            file_names = os.listdir(str(lib_path))
+        except OSError:
+            continue
+        for file_name in file_names:
+            if file_name.startswith(prefix) and file_name.endswith(".py"):
+                names.add(file_name[len(prefix) : -len(".py")])
+    archive = _bundle(lib_paths)
+    if archive:
+        names.update(archive.index)
+    return names
+
+
+def parser_spec(parser):
+    """completion data of the `argparse` parser"""
+    import argparse
+
+    repeatable = (argparse._AppendAction, argparse._AppendConstAction)
+    repeatable += (argparse._CountAction,)
+    groups = {}
+    for number, group in enumerate(parser._mutually_exclusive_groups):
+        for action in group._group_actions:
+            groups[id(action)] = number
+    options = []
+    positionals = []
+    for action in parser._actions:
+        if action.help == argparse.SUPPRESS:
+            continue
+        choices = None
+        if action.choices is not None:
+            choices = [str(choice) for choice in action.choices]
+        if not action.option_strings:
+            positionals.append({"choices": choices})
+            continue
+        options.append(
+            {
+                "strings": list(action.option_strings),
+                "value": action.nargs != 0,
+                "choices": choices,
+                "repeat": isinstance(action, repeatable),
+                "group": groups.get(id(action)),
+            }
+        )
+    return {"options": options, "positionals": positionals}
+
+
+def _build_spec(path, subcommand, loader):
+    """import the subcommand and describe its parser, `None` on failure"""
+    import contextlib
+    import io
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            module = loader(path, subcommand)
+            subcommand_type = dispatch.subcommand_class(module)
+            if not subcommand_type:
+                return None
+            instance = subcommand_type()
+            instance.module = module
+            parser = instance._create_parser(subcommand)
+            return parser_spec(instance._configure_parser(parser))
+    except Exception:
+        return None
+
+
+def _framework_signature():
+    try:
+        stat_result = os.stat(os.path.join(os.path.dirname(__file__), "subcommand.py"))
+    except OSError:
+        return None
+    return stat_result.st_mtime_ns
+
+
+def _locate(command_string, lib_paths, subcommand):
+    """`(path, signature, loader)` of the `subcommand`, `None` if unknown"""
+    path = dispatch.subcommand_path(command_string, lib_paths, subcommand)
+    if path:
+        key = stat_path = os.path.realpath(path)
+        loader = dispatch.load_module
+    else:
+        archive = _bundle(lib_paths)
+        path = archive.path(subcommand) if archive else None
+        if not path:
+            return None
+        key, stat_path = path, archive.importer.archive
+        loader = archive.load_module
+    try:
+        stat_result = os.stat(stat_path)
+    except OSError:
+        return None
+    signature = [
+        key,
+        stat_result.st_mtime_ns,
+        stat_result.st_size,
+        stat_result.st_ino,
+        _framework_signature(),
+    ]
+    return path, signature, loader
+
+
+def _spec_path(command_string, key):
+    digest = zlib.crc32(key.encode("utf-8", "surrogateescape"))
+    return os.path.join(_cache_dir(command_string), f"spec-{digest:08x}.marshal")
+
+
+def _load(spec_path):
+    try:
+        with open(spec_path, "rb") as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def _save(spec_path, data):
+    temp_path = f"{spec_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(spec_path), exist_ok=True)
+        with open(temp_path, "wb") as f:
+            marshal.dump(data, f)
+        os.replace(temp_path, spec_path)
+    except OSError:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+
+
+def subcommand_spec(command_string, lib_paths, subcommand):
+    """cached (or freshly built) parser spec of the `subcommand`"""
+    located = _locate(command_string, lib_paths, subcommand)
+    if not located:
+        return None
+    path, signature, loader = located
+    spec_path = _spec_path(command_string, signature[0])
+    data = _load(spec_path)
+    if (
+        isinstance(data, dict)
+        and data.get("version") == VERSION
+        and data.get("signature") == signature
+    ):
+        return data["spec"]
+    spec = _build_spec(path, subcommand, loader)
+    _save(spec_path, {"version": VERSION, "signature": signature, "spec": spec})
+    return spec
+
+
+def _option(spec, string):
+    for option in spec["options"]:
+        if string in option["strings"]:
+            return option
+    return None
+
+
+def _matching(candidates, prefix):
+    return [candidate for candidate in candidates if candidate.startswith(prefix)]
+
+
+def complete_arguments(spec, words):
+    """candidates for the last of the subcommand `words`"""
+    current = words[-1]
+    previous = words[:-1]
+    if "--" in previous:
+        return []
+    if len(previous) >= 2 and previous[-1] == "=":  # bash splits `--option=`
+        option = _option(spec, previous[-2])
+        return _matching((option or {}).get("choices") or [], current)
+    if current.startswith("--") and "=" in current:
+        name, value = current.split("=", 1)
+        choices = (_option(spec, name) or {}).get("choices") or []
+        return [f"{name}={choice}" for choice in _matching(choices, value)]
+    if previous:
+        option = _option(spec, previous[-1])
+        if option and option["value"]:
+            return _matching(option["choices"] or [], current)
+    if current.startswith("-"):
+        used = [_option(spec, word.split("=", 1)[0]) for word in previous]
+        used = [option for option in used if option]
+        groups = set(option["group"] for option in used) - {None}
+        candidates = []
+        for option in spec["options"]:
+            if option in used and not option["repeat"]:
+                continue
+            if option["group"] in groups and option not in used:
+                continue
+            candidates += option["strings"]
+        return _matching(candidates, current)
+    candidates = []
+    for positional in spec["positionals"]:
+        candidates += positional["choices"] or []
+    return _matching(candidates, current)
+
+
+def complete(command_string, lib_path, words):
+    """candidates for the last of the command line `words` (w/o command)"""
+    lib_paths = dispatch.search_path(command_string, lib_path)
+    if not words:
+        words = [""]
+    if len(words) == 1:
+        if words[0].startswith("-"):
+            return _matching(["-h", "--help"], words[0])
+        return sorted(_matching(subcommand_names(command_string, lib_paths), words[0]))
+    spec = subcommand_spec(command_string, lib_paths, words[0])
+    return complete_arguments(spec, words[1:]) if spec else []
+
+
+def run(command_string, lib_path, words):
+    """print completion candidates, return exit code"""
+    candidates = complete(command_string, lib_path, words)
+    sys.stdout.write("".join(f"{candidate}\n" for candidate in candidates))
+    return 0
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Fast dispatch of a named subcommand.
+
+`cmd ‹subcommand›` goes straight to `‹lib›/cmd-‹subcommand›.py` (or the
+alias symlink of that name) without scanning the lib directory. The
+command framework (`Command`, the subcommand index) is only imported for
+help and for names which cannot be resolved directly.
+
+Subcommands are searched in the directories of `CMD_PATH` (separated by
+`os.pathsep`), then in the directories listed in the config file
+`$XDG_CONFIG_HOME/cmd/path` (one per line), and finally in the built-in
+lib directory; the first directory containing a subcommand wins.
+Subcommands of a bundle (`cmd bundle`) are looked up in its prebuilt
+index instead.
+
+`cmd --complete WORD...` is answered by `cmdutil.completion`, without
+loading any subcommand whose completion data is cached.
+
+If `CMD_SERVER` names the socket of a warm server (`cmd server`), the
+invocation is forwarded to it instead; see `cmdutil.server`.
+"""
+
+import os
+import sys
+
+from . import trace
+
+HELP_OPTIONS = ["-h", "-?", "--help"]
+SERVER_VARIABLE = "CMD_SERVER"
+SERVER_SUBCOMMAND = "server"
+COMPLETE_OPTION = "--complete"
+PATH_VARIABLE = "CMD_PATH"
+PATH_CONFIG = "path"
+
+_modules = {}
+
+
+def command_stem(command_string):
+    """name of the command without extension (prefix of subcommand files)"""
+    return os.path.splitext(os.path.basename(str(command_string)))[0]
+
+
+def _configured_directories(command_string):
+    base = os.getenv("XDG_CONFIG_HOME") or os.path.join(
+        os.path.expanduser("~"), ".config"
+    )
+    config_dir = os.path.join(base, command_stem(command_string))
+    try:
+        with open(os.path.join(config_dir, PATH_CONFIG), "r") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    directories = []
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if line:
+            directories.append(os.path.join(config_dir, os.path.expanduser(line)))
+    return directories
+
+
+def search_path(command_string, lib_path):
+    """ordered subcommand directories, `lib_path` last"""
+    directories = (os.getenv(PATH_VARIABLE) or "").split(os.pathsep)
+    directories += _configured_directories(command_string)
+    directories.append(str(lib_path))
+    search = []
+    seen = set()
+    for directory in directories:
+        if not directory:
+            continue
+        key = os.path.abspath(directory)
+        if key not in seen:
+            seen.add(key)
+            search.append(directory)
+    return search
+
+
+def subcommand_path(command_string, lib_paths, subcommand):
+    """candidate file of the `subcommand`, `None` if there is none"""
+    if not subcommand or subcommand.startswith((".", "-")) or os.sep in subcommand:
+        return None
+    file_name = f"{command_stem(command_string)}-{subcommand}.py"
+    for lib_path in lib_paths:
+        path = os.path.join(str(lib_path), file_name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def load_module(path, subcommand):
+    """
+    execute subcommand module at `path`
+
+    A module already executed by this process is reused unless its file
+    changed since.
+    """
+    module_name = f"subcommand.{subcommand}"
+    stat_result = os.stat(str(path))
+    signature = (str(path), stat_result.st_mtime_ns, stat_result.st_size)
+    loaded = _modules.get(module_name)
+    if loaded and loaded[0] == signature:
+        return loaded[1]
+    import importlib.util  # not needed by forwarding to the server
+
+    spec = importlib.util.spec_from_file_location(module_name, str(path))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    with trace.span("module", module=module_name, path=str(path)):
+        spec.loader.exec_module(module)
+    _modules[module_name] = (signature, module)
+    return module
+
+
+def subcommand_class(module, class_name=None):
+    """the `Subcommand`-derived class of the `module`"""
+    from .subcommand import Subcommand
+
+    candidates = [getattr(module, class_name, None)] if class_name else []
+    candidates += vars(module).values()
+    for candidate in candidates:
+        if isinstance(candidate, type) and issubclass(candidate, Subcommand):
+            return candidate
+    return None
+
+
+def run(command_string, description, lib_path, args):
+    """run the subcommand named by `args`, falling back to `Command`"""
+    if len(args) > 1 and args[1] == COMPLETE_OPTION:
+        from . import completion
+
+        sys.exit(completion.run(command_string, lib_path, args[2:]))
+    subcommand = args[1] if len(args) > 1 and args[1] not in HELP_OPTIONS else None
+    socket_path = os.getenv(SERVER_VARIABLE)
+    if socket_path and subcommand != SERVER_SUBCOMMAND:
+        from . import client
+
+        returncode = client.run(socket_path, args)
+        if returncode is not None:
+            sys.exit(returncode)
+    with trace.span("dispatch", subcommand=subcommand):
+        lib_paths = search_path(command_string, lib_path)
+        path = subcommand_path(command_string, lib_paths, subcommand)
+        loader = load_module
+        if not path and subcommand and not os.path.isdir(str(lib_path)):
+            from . import bundle
+
+            archive = bundle.find(lib_path)
+            if archive:
+                path = archive.path(subcommand)
+                loader = archive.load_module
+    if path:
+        subcommand_type = subcommand_class(loader(path, subcommand))
+        if subcommand_type:
+            sys.exit(subcommand_type().run(args, subcommand=subcommand))
+    from .command import Command
+
+    Command(command_string, description, lib_path).run(args)
+
+
+if __name__ == "__main__":
+    pass
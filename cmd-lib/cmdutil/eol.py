@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+End-of-line statistics and conversion of files (see `cmd eol`).
+
+Files are read in fixed-size chunks and scanned with bulk `bytes`
+operations, so throughput is close to the disk speed and memory use does
+not depend on the file size. A CR at the end of a chunk is resolved with
+the first byte of the next one.
+
+A converted file is written to a temporary file in the same directory,
+synced and renamed over the original, so a crash leaves either the old
+or the new content. Files which already conform are never written.
+
+`StatCache` remembers the counts of files, and the separators they are
+known to conform to, between runs: `stat_entry()` / `convert_entry()`
+do not read a file whose size, mtime and inode did not change.
+"""
+
+import os
+import re
+import stat
+import tempfile
+
+from . import cache
+from .walk import is_binary
+
+CHUNK_SIZE = 1 << 20
+NAMES = ["nix", "mac", "dos"]  # in the order of counts
+SEPARATORS = {b"\n": "nix", b"\r": "mac", b"\r\n": "dos"}
+VIOLATIONS = {
+    "nix": re.compile(rb"\r\n?"),
+    "mac": re.compile(rb"\r?\n"),
+    "dos": re.compile(rb"\r(?!\n)|(?<!\r)\n"),
+}
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """yield the content of the file at `path` in chunks"""
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def count(chunks):
+    """`(nix, mac, dos)` line ending counts of the consecutive `chunks`"""
+    nix = 0
+    mac = 0
+    dos = 0
+    pending_cr = False
+    for chunk in chunks:
+        start = 0
+        if pending_cr:
+            if chunk[:1] == b"\n":
+                dos += 1
+                start = 1
+            else:
+                mac += 1
+        crlf = chunk.count(b"\r\n", start)
+        cr = chunk.count(b"\r", start)
+        lf = chunk.count(b"\n", start)
+        pending_cr = chunk.endswith(b"\r")
+        if pending_cr:
+            cr -= 1
+        nix += lf - crlf
+        mac += cr - crlf
+        dos += crlf
+    if pending_cr:
+        mac += 1
+    return (nix, mac, dos)
+
+
+def stat_path(path, chunk_size=CHUNK_SIZE):
+    """`(nix, mac, dos)` line ending counts of the file at `path`"""
+    return count(read_chunks(path, chunk_size))
+
+
+def convert_chunk(chunk, separator):
+    """`chunk` (not ending in a CR split from its LF) with `separator` eols"""
+    if b"\r" in chunk:
+        chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    if separator != b"\n":
+        chunk = chunk.replace(b"\n", separator)
+    return chunk
+
+
+def _split_chunks(chunks):
+    """re-split `chunks` so that none of them ends with a CR of a CRLF"""
+    pending = b""
+    for chunk in chunks:
+        if pending:
+            chunk = pending + chunk
+            pending = b""
+        if chunk.endswith(b"\r"):
+            chunk, pending = chunk[:-1], chunk[-1:]
+        if chunk:
+            yield chunk
+    if pending:
+        yield pending
+
+
+def _conforming_chunk(chunk, separator):
+    if separator == b"\n":
+        return b"\r" not in chunk
+    if separator == b"\r":
+        return b"\n" not in chunk
+    crlf = chunk.count(b"\r\n")
+    return chunk.count(b"\r") == crlf and chunk.count(b"\n") == crlf
+
+
+def first_violation(path, separator, chunk_size=CHUNK_SIZE):
+    """
+    `(line, kind)` of the first line ending other than `separator` in the
+    file at `path`, `None` if the file conforms
+
+    Scanning stops at the first offending chunk; a conforming chunk costs
+    a bulk search and a count.
+    """
+    line = 1
+    for chunk in _split_chunks(read_chunks(path, chunk_size)):
+        if _conforming_chunk(chunk, separator):
+            line += chunk.count(separator)
+            continue
+        match = VIOLATIONS[SEPARATORS[separator]].search(chunk)
+        line += sum(count([chunk[: match.start()]]))
+        return line, SEPARATORS[match.group()]
+    return None
+
+
+def _copy_prefix(path, f, size, chunk_size):
+    with open(path, "rb", buffering=0) as source:
+        while size > 0:
+            chunk = source.read(min(size, chunk_size))
+            if not chunk:
+                raise OSError(f"`{path}` shrank during conversion")
+            f.write(chunk)
+            size -= len(chunk)
+
+
+def convert(path, separator, chunk_size=CHUNK_SIZE):
+    """
+    convert line endings of the file at `path` to `separator`
+
+    Returns whether the file changed. A symlink is followed, and its
+    target is replaced.
+    """
+    path = os.path.realpath(path)
+    f = None
+    temp_path = None
+    unchanged = 0
+    try:
+        for chunk in _split_chunks(read_chunks(path, chunk_size)):
+            converted = convert_chunk(chunk, separator)
+            if f is None:
+                if converted == chunk:
+                    unchanged += len(chunk)
+                    continue
+                directory, name = os.path.split(path)
+                fd, temp_path = tempfile.mkstemp(
+                    dir=directory, prefix=f".{name}.", suffix=".tmp"
+                )
+                f = os.fdopen(fd, "wb")
+                _copy_prefix(path, f, unchanged, chunk_size)
+            f.write(converted)
+        if f is None:
+            return False
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+        os.replace(temp_path, path)
+        temp_path = None
+        return True
+    finally:
+        if f is not None:
+            f.close()
+        if temp_path is not None:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+
+
+class StatCache(object):
+    """
+    persistent `(nix, mac, dos)` counts and conformity of files
+
+    An entry of a file is `[signature, counts, conforms, binary]`: its
+    size / mtime / inode, the counts (`None` if unknown), the names of
+    the separators the file is known to conform to, and whether it is
+    binary (`None` if not checked). At most `limit` files are kept; the
+    ones unused for the longest time are evicted.
+    """
+
+    VERSION = 2
+    LIMIT = 200000
+
+    def __init__(self, cache_path, limit=LIMIT, rebuild=False):
+        self.cache_path = cache_path
+        self.limit = limit
+        data = None if rebuild else cache.load(cache_path)
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            data = {}
+        self.run = data.get("run", 0) + 1
+        self.files = data.get("files") or {}
+        self.changed = rebuild
+
+    def get(self, path):
+        """cached entry of the file at `path`, `None` if unknown"""
+        stored = self.files.get(os.path.abspath(path))
+        return stored[:4] if stored else None
+
+    def update(self, path, entry):
+        self.files[os.path.abspath(path)] = list(entry) + [self.run]
+        self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        excess = len(self.files) - self.limit
+        if excess > 0:
+            by_use = sorted(self.files, key=lambda path: self.files[path][4])
+            for path in by_use[:excess]:
+                del self.files[path]
+        cache.save(
+            self.cache_path,
+            {"version": self.VERSION, "run": self.run, "files": self.files},
+        )
+        self.changed = False
+
+
+def _signature(path):
+    stat_result = os.stat(path)
+    return [stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino]
+
+
+def _conforms(entry, name):
+    _, counts, conforms, _ = entry
+    if name in conforms:
+        return True
+    if counts is None:
+        return False
+    return all(not n for other, n in zip(NAMES, counts) if other != name)
+
+
+def _current_entry(path, entry, skip_binary):
+    """
+    `entry` if still valid, else a fresh one
+
+    With `skip_binary`, a file is sniffed if it is not known whether it is
+    binary; otherwise `binary` of a fresh entry is `None` (unknown).
+    """
+    signature = _signature(path)
+    if not entry or entry[0] != signature:
+        entry = [signature, None, [], None]
+    if skip_binary and entry[3] is None:
+        entry = entry[:3] + [is_binary(path)]
+    return entry
+
+
+def stat_entry(item, skip_binary=False):
+    """
+    `(counts, entry)` of an `item`: `(path, cached entry or None)`
+
+    The file is read only if it changed since the entry was cached.
+    Counts of a skipped binary file are `None`.
+    """
+    path, entry = item
+    entry = _current_entry(path, entry, skip_binary)
+    if skip_binary and entry[3]:
+        return None, entry
+    if entry[1] is None:
+        entry = [entry[0], list(stat_path(path)), entry[2], entry[3]]
+    return tuple(entry[1]), entry
+
+
+def convert_entry(item, separator, skip_binary=False):
+    """
+    `(changed, entry)` of converting an `item`: `(path, cached entry or
+    None)`
+
+    The file is not read if it did not change since the entry, which
+    shows it conforms, was cached. `changed` of a skipped binary file is
+    `None`.
+    """
+    path, entry = item
+    name = SEPARATORS[separator]
+    entry = _current_entry(path, entry, skip_binary)
+    if skip_binary and entry[3]:
+        return None, entry
+    if _conforms(entry, name):
+        return False, entry
+    if convert(path, separator):
+        return True, [_signature(path), None, [name], entry[3]]
+    return False, [entry[0], entry[1], entry[2] + [name], entry[3]]
+
+
+def check_entry(item, separator, skip_binary=False):
+    """
+    `(violation, entry)` of checking an `item`: `(path, cached entry or
+    None)`
+
+    `violation` is the `(line, kind)` of the first offending line ending,
+    `False` if the file conforms, and `None` for a skipped binary file.
+    """
+    path, entry = item
+    name = SEPARATORS[separator]
+    entry = _current_entry(path, entry, skip_binary)
+    if skip_binary and entry[3]:
+        return None, entry
+    if _conforms(entry, name):
+        return False, entry
+    violation = first_violation(path, separator)
+    if violation is None:
+        return False, [entry[0], entry[1], entry[2] + [name], entry[3]]
+    return violation, entry
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Git repository metadata read directly from `.git`, without running git.
+
+`discover()` finds the repository of a directory the way git does (a
+`.git` directory, or a `gitdir:` file of a linked worktree or a
+submodule), and `Repository` answers what `git rev-parse --show-toplevel`,
+`git rev-parse HEAD`, `git rev-parse --abbrev-ref HEAD` and, for a
+detached HEAD, `git describe --all` would print, reading `HEAD`, loose
+refs and `packed-refs`.
+
+Anything the reader does not model exactly raises `Unsupported`, and the
+caller is expected to run git instead: `GIT_*` variables changing the
+discovery or the refs, `core.worktree` / `core.bare` / config includes,
+bare repositories, the reftable backend, repositories owned by another
+user, unborn branches, branch names the abbreviation of which would be
+ambiguous, and a detached HEAD not pointed at by exactly one tag.
+"""
+
+import os
+import re
+import zlib
+
+ENVIRONMENT = [
+    "GIT_DIR",
+    "GIT_WORK_TREE",
+    "GIT_COMMON_DIR",
+    "GIT_CEILING_DIRECTORIES",
+    "GIT_DISCOVERY_ACROSS_FILESYSTEM",
+    "GIT_NAMESPACE",
+    "GIT_CONFIG",
+    "GIT_CONFIG_GLOBAL",
+    "GIT_CONFIG_SYSTEM",
+    "GIT_CONFIG_COUNT",
+    "GIT_CONFIG_PARAMETERS",
+    "SUDO_UID",
+]
+UNSUPPORTED_CONFIG = {
+    ("core", "worktree"),
+    ("core", "bare"),
+    ("extensions", "refstorage"),
+    ("extensions", "worktreeconfig"),
+    ("include", "path"),
+}
+FALSE = {"false", "no", "off", "0"}
+OBJECT_ID = re.compile("^(?:[0-9a-f]{40}|[0-9a-f]{64})$")
+HEADS = "refs/heads/"
+TAGS = "refs/tags/"
+SYMREF_DEPTH = 5
+
+
+class Unsupported(Exception):
+    """the repository, or the query, needs git itself"""
+
+
+def _read(path):
+    """first line of the file at `path`, `None` if there is no such file"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.readline().rstrip("\n")
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        return None
+    except (OSError, UnicodeDecodeError) as e:
+        raise Unsupported(f"cannot read `{path}`: {e}")
+
+
+def _is_git_dir(path):
+    return os.path.isfile(os.path.join(path, "HEAD")) and os.path.isdir(
+        os.path.join(path, "objects")
+    )
+
+
+def _config(path):
+    """`{(section, key): value}` of the git config file at `path`"""
+    section = None
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            lines = f.readlines()
+    except OSError:
+        return {}
+    config = {}
+    for line in lines:
+        line = line.strip()
+        if not line or line[0] in "#;":
+            continue
+        if line.startswith("["):
+            section = line[1:].split("]")[0].split()[0].lower()
+            if section.startswith("includeif"):
+                section = "include"
+            continue
+        key, _, value = line.partition("=")
+        config[(section, key.strip().lower())] = value.strip().strip('"')
+    return config
+
+
+def discover(cwd=None):
+    """
+    `Repository` of the (physical) directory `cwd`, `None` if there is none
+
+    Raises `Unsupported` if the discovery cannot be replicated exactly.
+    """
+    if any(variable in os.environ for variable in ENVIRONMENT):
+        raise Unsupported("environment")
+    current = os.path.realpath(cwd or os.getcwd())
+    device = os.stat(current).st_dev
+    while True:
+        dot_git = os.path.join(current, ".git")
+        if os.path.isdir(dot_git):
+            if _is_git_dir(dot_git):
+                return Repository(current, dot_git)
+        elif os.path.isfile(dot_git):
+            line = _read(dot_git)
+            if not line or not line.startswith("gitdir: "):
+                raise Unsupported(f"invalid `{dot_git}`")
+            git_dir = os.path.join(current, line[len("gitdir: ") :])
+            return Repository(current, os.path.realpath(git_dir))
+        if _is_git_dir(current):
+            raise Unsupported("bare repository or inside of `.git`")
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        if os.stat(parent).st_dev != device:
+            raise Unsupported("filesystem boundary")
+        current = parent
+
+
+class Repository(object):
+    """
+    the worktree at `root` with the git directory `git_dir`
+
+    Loose refs are read on every query; `packed-refs` is read once.
+    """
+
+    def __init__(self, root, git_dir):
+        self.root = root
+        self.git_dir = git_dir
+        common_dir = _read(os.path.join(git_dir, "commondir"))
+        self.common_dir = (
+            os.path.realpath(os.path.join(git_dir, common_dir))
+            if common_dir
+            else git_dir
+        )
+        if not _is_git_dir(self.common_dir):
+            raise Unsupported(f"`{self.common_dir}` is not a git directory")
+        uid = os.geteuid() if hasattr(os, "geteuid") else None
+        if uid is not None and any(
+            os.stat(path).st_uid != uid for path in (root, git_dir)
+        ):
+            raise Unsupported("owned by another user (safe.directory)")
+        config = _config(os.path.join(self.common_dir, "config"))
+        if config.get(("core", "bare"), "").lower() in FALSE:
+            del config[("core", "bare")]
+        if config.keys() & UNSUPPORTED_CONFIG:
+            raise Unsupported("configuration")
+        self._packed = None
+        self._peeled = False
+
+    def _ref_path(self, name):
+        """loose ref file of `name` (per worktree, or shared)"""
+        if name == "HEAD" or not name.startswith("refs/"):
+            return os.path.join(self.git_dir, name)
+        if name.startswith(("refs/bisect/", "refs/worktree/", "refs/rewritten/")):
+            return os.path.join(self.git_dir, name)
+        return os.path.join(self.common_dir, name)
+
+    def packed_refs(self):
+        """`{name: (object id, peeled id or None)}` of `packed-refs`"""
+        if self._packed is not None:
+            return self._packed
+        packed = {}
+        peeled = False
+        path = os.path.join(self.common_dir, "packed-refs")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            lines = []
+        except (OSError, UnicodeDecodeError) as e:
+            raise Unsupported(f"cannot read `{path}`: {e}")
+        name = None
+        for line in lines:
+            if line.startswith("#"):
+                peeled = " peeled" in line or " fully-peeled" in line
+            elif line.startswith("^") and name:
+                packed[name] = (packed[name][0], line[1:])
+            else:
+                object_id, _, name = line.partition(" ")
+                if not OBJECT_ID.match(object_id):
+                    raise Unsupported(f"invalid `{path}`")
+                packed[name] = (object_id, None)
+        self._packed = packed
+        self._peeled = peeled
+        return packed
+
+    def read_ref(self, name):
+        """raw value of the ref `name` (`ref: ...` or an id), `None` if absent"""
+        line = _read(self._ref_path(name))
+        if line is not None:
+            return line.strip()
+        entry = self.packed_refs().get(name)
+        return entry[0] if entry else None
+
+    def resolve(self, name, depth=SYMREF_DEPTH):
+        """object id of the ref `name` (following symrefs), `None` if absent"""
+        value = self.read_ref(name)
+        if value is None:
+            return None
+        if value.startswith("ref: "):
+            if depth == 0:
+                raise Unsupported("symref loop")
+            return self.resolve(value[len("ref: ") :], depth - 1)
+        if not OBJECT_ID.match(value):
+            raise Unsupported(f"invalid ref `{name}`")
+        return value
+
+    def head(self):
+        """
+        `(branch ref, object id)` of HEAD; the branch is `None` if detached
+
+        Raises `Unsupported` for an unborn branch or a reftable HEAD.
+        """
+        value = self.read_ref("HEAD")
+        if value is None:
+            raise Unsupported("no HEAD")
+        if not value.startswith("ref: "):
+            if not OBJECT_ID.match(value):
+                raise Unsupported("invalid HEAD")
+            return None, value
+        branch = value[len("ref: ") :]
+        if not branch.startswith(HEADS) or branch == HEADS + ".invalid":
+            raise Unsupported(f"HEAD refers to `{branch}`")
+        object_id = self.resolve(branch)
+        if object_id is None:
+            raise Unsupported("unborn branch")
+        return branch, object_id
+
+    def toplevel(self):
+        """`git rev-parse --show-toplevel`"""
+        return self.root
+
+    def sha(self):
+        """`git rev-parse HEAD`"""
+        return self.head()[1]
+
+    def abbreviated_branch(self, branch):
+        """
+        `branch` as shortened by `git rev-parse --abbrev-ref`, which leaves
+        a prefix if the short name also names another ref
+        """
+        name = branch[len(HEADS) :]
+        others = [
+            "refs/" + name,
+            TAGS + name,
+            "refs/remotes/" + name,
+            "refs/remotes/" + name + "/HEAD",
+        ]
+        if os.path.exists(os.path.join(self.git_dir, name)) or os.path.exists(
+            os.path.join(self.common_dir, name)
+        ):
+            raise Unsupported(f"ambiguous `{name}`")
+        if any(self.read_ref(other) is not None for other in others):
+            raise Unsupported(f"ambiguous `{name}`")
+        return name
+
+    def _tags(self):
+        """`{name: object id}` of all tags, loose ones overriding packed"""
+        tags = {
+            name: object_id
+            for name, (object_id, _) in self.packed_refs().items()
+            if name.startswith(TAGS)
+        }
+        for directory, _, files in os.walk(os.path.join(self.common_dir, TAGS)):
+            for file in files:
+                path = os.path.join(directory, file)
+                name = os.path.relpath(path, self.common_dir).replace(os.sep, "/")
+                tags[name] = self.resolve(name)
+        return tags
+
+    def _peel(self, name, object_id, depth=SYMREF_DEPTH):
+        """the object an (annotated) tag `object_id` points at"""
+        packed = self.packed_refs().get(name)
+        if packed and packed[0] == object_id and self._peeled:
+            return packed[1] or object_id
+        path = os.path.join(self.common_dir, "objects", object_id[:2], object_id[2:])
+        try:
+            with open(path, "rb") as f:
+                header = zlib.decompressobj().decompress(f.read(), 256)
+        except FileNotFoundError:
+            raise Unsupported(f"`{object_id}` not loose")
+        except (OSError, zlib.error) as e:
+            raise Unsupported(f"cannot read `{object_id}`: {e}")
+        if not header.startswith(b"tag "):
+            return object_id
+        target = header.split(b"\0", 1)[1].split(b"\n", 1)[0]
+        if not target.startswith(b"object ") or depth == 0:
+            raise Unsupported(f"cannot peel `{object_id}`")
+        return self._peel(None, target[len(b"object ") :].decode(), depth - 1)
+
+    def ref(self):
+        """
+        the current branch, or the tag HEAD is detached at
+
+        This is what `git rev-parse --abbrev-ref HEAD` prints, and for a
+        detached HEAD the tag of `git describe --all` if it is an exact
+        match (no other ref takes precedence over a tag).
+        """
+        branch, object_id = self.head()
+        if branch is not None:
+            return self.abbreviated_branch(branch)
+        tags = [
+            name
+            for name, tag_id in self._tags().items()
+            if tag_id is not None
+            and (tag_id == object_id or self._peel(name, tag_id) == object_id)
+        ]
+        if len(tags) != 1:
+            raise Unsupported(f"{len(tags)} tags at HEAD")
+        return tags[0][len(TAGS) :]
+
+
+if __name__ == "__main__":
+    pass
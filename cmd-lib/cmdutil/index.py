@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Persistent index of subcommand metadata.
+
+The index maps every subcommand name to its directory (root) and file
+name, the resolved target (aliases are symlinks sharing a target), the
+one-line description and the name of the `Subcommand` class. Entries are
+keyed on the target's mtime / size / inode, so only the files that
+changed since the last run are inspected again, and the listing of a
+root is reused while the root's own mtime does not change.
+
+All roots of a search path share a single cache file. Roots are merged
+in order: a subcommand of an earlier root shadows the same name in the
+later ones.
+"""
+
+import os
+import pathlib
+import stat
+
+from . import cache
+
+
+class SubcommandIndex(object):
+    VERSION = 2
+
+    def __init__(self, roots, cache_path, discover, describe):
+        """
+        `discover(root)` yields `(subcommand, path)` pairs of a root,
+        `describe(path, subcommand)` returns `(description, class_name)` of
+        a single file.
+        """
+        self.roots = [pathlib.Path(root) for root in roots]
+        self.cache_path = cache_path
+        self.discover = discover
+        self.describe = describe
+        self.entries = None
+
+    @staticmethod
+    def _directory_signature(root):
+        try:
+            stat_result = os.stat(str(root))
+        except OSError:
+            return None
+        return [stat_result.st_mtime_ns, stat_result.st_ino]
+
+    def _load(self):
+        data = cache.load(self.cache_path)
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            return {}
+        return data.get("roots") or {}
+
+    def _listing(self, root, directory, cached):
+        """`(subcommand, file_name)` pairs of the `root`"""
+        if directory is None:
+            return []
+        if directory == cached.get("directory"):
+            return [
+                (subcommand, entry["file"])
+                for subcommand, entry in cached["subcommands"].items()
+            ]
+        return [(subcommand, path.name) for subcommand, path in self.discover(root)]
+
+    def _refresh_root(self, root, cached, described):
+        """bring the `root` section up to date, return `(section, changed)`"""
+        directory = self._directory_signature(root)
+        cached_entries = cached.get("subcommands") or {}
+        listing = self._listing(root, directory, cached)
+        changed = directory != cached.get("directory")
+        changed = changed or len(listing) != len(cached_entries)
+        real_root = os.path.realpath(str(root))
+        entries = {}
+        for subcommand, file_name in listing:
+            path = os.path.join(str(root), file_name)
+            try:
+                stat_result = os.lstat(path)
+                link = stat.S_ISLNK(stat_result.st_mode)
+                if link:
+                    stat_result = os.stat(path)
+            except OSError:
+                changed = True
+                continue
+            signature = cache.signature(stat_result)
+            if link:
+                target = os.path.realpath(path)
+            else:
+                target = os.path.join(real_root, file_name)
+            entry = cached_entries.get(subcommand)
+            if (
+                not entry
+                or entry.get("file") != file_name
+                or entry.get("target") != target
+                or entry.get("signature") != signature
+            ):
+                key = (target, tuple(signature))
+                if key not in described:
+                    described[key] = self.describe(pathlib.Path(path), subcommand)
+                description, class_name = described[key]
+                entry = {
+                    "root": str(root),
+                    "file": file_name,
+                    "target": target,
+                    "link": link,
+                    "signature": signature,
+                    "description": description,
+                    "class": class_name,
+                }
+                changed = True
+            entries[subcommand] = entry
+        return {"directory": directory, "subcommands": entries}, changed
+
+    def refresh(self):
+        """bring the index up to date, return merged `{subcommand: entry}`"""
+        cached_roots = self._load()
+        described = {}
+        sections = {}
+        changed = False
+        for root in self.roots:
+            sections[str(root)], root_changed = self._refresh_root(
+                root, cached_roots.get(str(root)) or {}, described
+            )
+            changed = changed or root_changed
+        if changed or set(sections) != set(cached_roots):
+            cache.save(self.cache_path, {"version": self.VERSION, "roots": sections})
+        entries = {}
+        for root in self.roots:
+            for subcommand, entry in sections[str(root)]["subcommands"].items():
+                entries.setdefault(subcommand, entry)
+        self.entries = entries
+        return entries
+
+
+if __name__ == "__main__":
+    pass
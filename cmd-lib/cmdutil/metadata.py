@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Static extraction of subcommand metadata.
+
+The module source is parsed, not executed: the docstrings and the name of
+the `Subcommand`-derived class are read from the syntax tree, so no
+top-level imports of the subcommand are run.
+"""
+
+import ast
+
+BASE_CLASS = "Subcommand"
+
+
+def _base_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def _subcommand_class(tree):
+    """
+    first top-level class derived from `Subcommand`
+
+    Returns `False` if it cannot be decided statically (e.g. the class
+    derives from an imported base which may or may not be a subcommand).
+    """
+    known = {BASE_CLASS}
+    undecided = False
+    found = None
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        bases = [_base_name(base) for base in node.bases]
+        if any(base in known for base in bases):
+            known.add(node.name)
+            found = found or node
+        elif bases and not all(base == "object" for base in bases):
+            undecided = True
+    if found is None and undecided:
+        return False
+    return found
+
+
+def module_docstring(path):
+    """docstring of the module at `path` (empty if none or unreadable)"""
+    try:
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), filename=str(path))
+    except (OSError, SyntaxError, ValueError):
+        return ""
+    return ast.get_docstring(tree, clean=False) or ""
+
+
+def extract(path):
+    """
+    return `(description, class_name)` of the subcommand at `path`
+
+    `None` is returned when static analysis cannot decide, in which case
+    the caller is expected to import the module.
+    """
+    try:
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), filename=str(path))
+    except (OSError, SyntaxError, ValueError):
+        return None
+    subcommand_class = _subcommand_class(tree)
+    if subcommand_class is False:
+        return None
+    description = (ast.get_docstring(tree, clean=False) or "").strip()
+    if not description and subcommand_class:
+        description = (ast.get_docstring(subcommand_class, clean=False) or "").strip()
+    class_name = subcommand_class.name if subcommand_class else None
+    return description.split("\n", 1)[0].strip(), class_name
+
+
+if __name__ == "__main__":
+    pass
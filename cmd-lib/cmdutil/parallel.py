@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Worker pools for subcommands processing many independent items.
+"""
+
+import collections
+import concurrent.futures
+import itertools
+import multiprocessing
+import os
+
+
+def default_jobs():
+    """number of workers for `--jobs 0`"""
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else 4
+
+
+def executor(jobs, processes=True, initializer=None, initargs=()):
+    """
+    pool of `jobs` workers
+
+    Process pools fork where available, so the workers inherit modules
+    already imported (including subcommand modules, which are not
+    importable by name).
+    """
+    jobs = jobs or default_jobs()
+    if not processes:
+        return concurrent.futures.ThreadPoolExecutor(
+            jobs, initializer=initializer, initargs=initargs
+        )
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    return concurrent.futures.ProcessPoolExecutor(
+        jobs, mp_context=context, initializer=initializer, initargs=initargs
+    )
+
+
+def imap(pool, function, iterable, window=None, ordered=True):
+    """
+    lazily map `function` over `iterable` in the `pool`
+
+    Yields `(item, future)` pairs, in input order if `ordered`, else as
+    they complete. At most `window` items (four per worker by default)
+    are in flight, so `iterable` is consumed as results are consumed and
+    first results are available before the input is exhausted. Items not
+    started yet are cancelled when the consumer stops early.
+    """
+    window = window or 4 * (getattr(pool, "_max_workers", None) or default_jobs())
+    items = iter(iterable)
+    pending = collections.deque()
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < window:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.append((item, pool.submit(function, item)))
+            if not pending:
+                return
+            if ordered:
+                yield pending.popleft()
+                continue
+            futures = {future: index for index, (_, future) in enumerate(pending)}
+            done, _ = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for index in sorted((futures[future] for future in done), reverse=True):
+                yield pending[index]
+                del pending[index]
+    finally:
+        for _, future in pending:  # abandoned by the consumer
+            future.cancel()
+
+
+def batched(iterable, size):
+    """yield lists of up to `size` consecutive items of `iterable`"""
+    items = iter(iterable)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def call_each(function, items):
+    """
+    `(result, exception)` of `function` for each of `items`
+
+    Used to amortize the per-task overhead of a pool over a batch of
+    small items; an exception fails a single item, not the whole batch.
+    """
+    outcomes = []
+    for item in items:
+        try:
+            outcomes.append((function(item), None))
+        except Exception as e:
+            outcomes.append((None, e))
+    return outcomes
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+In-process pipelines of subcommands.
+
+A pipeline `a ARGS | b ARGS | c ARGS` runs all stages in one process:
+every stage but the last one yields records (paths, statistics, ...)
+from its `records()` generator, and the next stage reads them through
+`upstream_records()`. Records are pulled one at a time by the downstream
+stage, so a stage never runs ahead of its consumer (backpressure) and no
+stage materializes the whole stream. The last stage runs its regular
+`execute()`, so its output is the same as when it runs alone.
+"""
+
+from .subcommand import SubcommandError, exit_code
+
+SEPARATOR = "|"
+
+
+def split(argv, separator=SEPARATOR):
+    """split `argv` into stages at `separator` arguments"""
+    stages = [[]]
+    for arg in argv:
+        if arg == separator:
+            stages.append([])
+        else:
+            stages[-1].append(arg)
+    return stages
+
+
+class Pipeline(object):
+    def __init__(self, command):
+        self.command = command
+
+    def _instantiate(self, stages):
+        instances = []
+        last = len(stages) - 1
+        for position, argv in enumerate(stages):
+            if not argv:
+                print(f"empty pipeline stage #{position + 1}")
+                return None
+            instance = self.command.instantiate(argv[0])
+            if not instance:
+                return None
+            if position < last and not instance.produces:
+                print(f"`{argv[0]}` does not produce records, it must be last")
+                return None
+            if position > 0 and not instance.consumes:
+                print(f"`{argv[0]}` does not consume records, it must be first")
+                return None
+            instances.append(instance)
+        return instances
+
+    def call(self, stages):
+        """run the pipeline, return exit code"""
+        instances = self._instantiate(stages)
+        if not instances:
+            return 2
+        command_string = str(self.command.command)
+        upstream = None
+        try:
+            for instance, argv in zip(instances[:-1], stages):
+                instance.upstream = upstream
+                returncode = instance.prepare([command_string] + argv, argv[0])
+                if returncode is not None:
+                    return returncode
+                upstream = instance.records()
+            instances[-1].upstream = upstream
+            return instances[-1].call([command_string] + stages[-1], stages[-1][0])
+        except SubcommandError as e:
+            return e.returncode
+        except SystemExit as e:
+            return exit_code(e)
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Line-oriented regular expression search in files (see `cmd grep`).
+
+A file is memory-mapped and searched as a whole with a compiled `bytes`
+regular expression, so lines are never split or decoded one by one; only
+lines containing a match are extracted. Patterns are Python regular
+expressions, compiled with `re.MULTILINE` (`^` / `$` match at line
+boundaries), and matches are reported per line, like grep does: a match
+spanning lines (like `o\\sx` across a newline) does not count, the line
+it starts on is searched by itself instead.
+"""
+
+import mmap
+import re
+
+from .walk import is_binary
+
+
+def compile_patterns(patterns, ignore_case=False, word=False):
+    """
+    regular expression matching any of `patterns`
+
+    With `word`, a match must not be preceded or followed by a word
+    character (like `grep -w`).
+    """
+    alternatives = []
+    for pattern in patterns:
+        if word:
+            pattern = rf"(?<!\w)(?:{pattern})(?!\w)"
+        alternatives.append(f"(?:{pattern})")
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    return re.compile("|".join(alternatives).encode(), flags)
+
+
+def _lines(data, regex, files_only):
+    """yield `(line number, line)` of lines of `data` matching `regex`"""
+    line_number = 1
+    counted = 0
+    position = 0
+    while position < len(data):
+        match = regex.search(data, position)
+        if match is None:
+            return
+        start = data.rfind(b"\n", 0, match.start()) + 1
+        if start == len(data):
+            return  # after the final newline
+        end = data.find(b"\n", match.start())
+        end = len(data) if end < 0 else end
+        if match.end() > end and not regex.search(data[start:end]):
+            position = end + 1  # the match spans lines, none within the line
+            continue
+        if files_only:
+            yield None, None
+            return
+        line_number += data[counted:start].count(b"\n")
+        counted = start
+        yield line_number, bytes(data[start:end])
+        position = end + 1
+
+
+def search_path(path, regex, files_only=False, skip_binary=True):
+    """
+    `[(line number, line)]` of the lines of the file at `path` matching
+    `regex`, `None` for a skipped binary file
+
+    With `files_only`, the search stops at the first match, and its
+    result is `[(None, None)]`.
+    """
+    if skip_binary and is_binary(path):
+        return None
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file, cannot be mapped
+            data = b""
+        try:
+            return list(_lines(data, regex, files_only))
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+
+def highlight(line, regex, start, end):
+    """`line` with matches of `regex` wrapped in the `start` / `end` codes"""
+    if not start:
+        return line
+    return regex.sub(
+        lambda match: start + match.group() + end if match.group() else b"", line
+    )
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Warm `cmd` server.
+
+The server is a long-lived process listening on a Unix socket. It keeps
+the framework and all subcommand modules imported; a module is executed
+again when its file changes. Every request is served by a forked worker,
+so `sys.exit`, `sys.argv`, the working directory, the environment and
+any other process-global state of a subcommand stay private to the
+request. The worker adopts the client's stdin / stdout / stderr (passed
+as file descriptors) and reports the exit code back to the client.
+
+Only the user running the server is served: the peer's uid is checked
+where the platform reports it (`SO_PEERCRED` / `getpeereid()`); elsewhere
+the socket must be private to the user (mode 0600), or the server refuses
+to start.
+
+Changes of `cmdutil` itself require a restart of the server.
+"""
+
+import array
+import marshal
+import os
+import signal
+import socket
+import stat
+import struct
+import sys
+import traceback
+
+from . import dispatch
+from .client import INT
+from .command import Command
+from .subcommand import exit_code
+
+PEER_CREDENTIALS = hasattr(socket, "SO_PEERCRED") or hasattr(os, "getpeereid")
+
+
+def _receive_request(connection):
+    fd_size = array.array("i").itemsize
+    data, ancillary, _, _ = connection.recvmsg(65536, socket.CMSG_SPACE(3 * fd_size))
+    fds = array.array("i")
+    for level, kind, cmsg_data in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(cmsg_data[: len(cmsg_data) - len(cmsg_data) % fd_size])
+    if len(data) < INT.size:
+        return None, list(fds)
+    size = INT.unpack(data[: INT.size])[0]
+    payload = data[INT.size :]
+    while len(payload) < size:
+        chunk = connection.recv(size - len(payload))
+        if not chunk:
+            return None, list(fds)
+        payload += chunk
+    return marshal.loads(payload), list(fds)
+
+
+def _peer_uid(connection):
+    """uid of the peer of `connection`, `None` without `PEER_CREDENTIALS`"""
+    if hasattr(socket, "SO_PEERCRED"):
+        credentials = connection.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+        return struct.unpack("3i", credentials)[1]
+    if hasattr(os, "getpeereid"):
+        return os.getpeereid(connection.fileno())[0]
+    return None
+
+
+def _check_private(socket_path):
+    """
+    raise `OSError` unless the socket at `socket_path` is owned by the
+    current user and accessible to nobody else
+    """
+    stat_result = os.stat(socket_path)
+    if stat_result.st_uid != os.getuid() or stat.S_IMODE(stat_result.st_mode) & 0o077:
+        raise OSError(
+            f"cannot restrict `{socket_path}` to the current user"
+            " (peer credentials are not available on this platform)"
+            "; the server is disabled"
+        )
+
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt  # stops `serve()` like SIGINT does, cleaning up
+
+
+class Server(object):
+    def __init__(self, command_string, description, lib_path, socket_path):
+        self.command_string = os.path.abspath(str(command_string))
+        self.description = description
+        self.lib_path = os.path.abspath(str(lib_path))
+        self.socket_path = socket_path
+        self.directory = None
+        self.subcommands = {}
+
+    def _command(self):
+        return Command(self.command_string, self.description, self.lib_path)
+
+    def preload(self):
+        """import (or re-import changed) subcommand modules"""
+        directory = []
+        for lib_path in dispatch.search_path(self.command_string, self.lib_path):
+            try:
+                directory.append(os.stat(lib_path).st_mtime_ns)
+            except OSError:
+                directory.append(None)
+        if directory != self.directory:
+            command = self._command()
+            command._load_subcommands()
+            self.subcommands = command.subcommands
+            self.directory = directory
+        for subcommand, path in sorted(self.subcommands.items()):
+            try:
+                dispatch.load_module(path, subcommand)
+            except Exception:
+                print(f"cannot preload `{subcommand}`:", file=sys.stderr)
+                traceback.print_exc()
+
+    def _adopt(self, request, fds):
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        for stream in [sys.stdout, sys.stderr]:
+            stream.flush()
+        for target, fd in enumerate(fds[:3]):
+            os.dup2(fd, target)
+            os.close(fd)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", buffering=1 if os.isatty(1) else -1, closefd=False)
+        sys.stderr = open(2, "w", buffering=1, closefd=False)
+        sys.argv = list(request["argv"])
+
+    def _work(self, connection):
+        """serve a single request (in the forked worker)"""
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        request, fds = _receive_request(connection)
+        if request is None or len(fds) != 3:
+            return 1
+        connection.sendall(INT.pack(os.getpid()))
+        self._adopt(request, fds)
+        try:
+            returncode = self._command().call(sys.argv)
+        except SystemExit as e:
+            returncode = exit_code(e)
+        except KeyboardInterrupt:
+            returncode = 130
+        except Exception:
+            traceback.print_exc()
+            returncode = 1
+        for stream in [sys.stdout, sys.stderr]:
+            try:
+                stream.flush()
+            except OSError:
+                pass
+        connection.sendall(INT.pack(returncode))
+        return 0
+
+    def _listen(self):
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+                raise OSError(f"server already listening on `{self.socket_path}`")
+            except ConnectionRefusedError:
+                os.unlink(self.socket_path)
+            finally:
+                probe.close()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            listener.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        if not PEER_CREDENTIALS:
+            try:
+                _check_private(self.socket_path)
+            except OSError:
+                listener.close()
+                os.unlink(self.socket_path)
+                raise
+        listener.listen(64)
+        return listener
+
+    def serve(self):
+        """serve requests until interrupted (SIGINT) or terminated (SIGTERM)"""
+        self.preload()
+        listener = self._listen()
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, _terminate)
+        try:
+            while True:
+                connection, _ = listener.accept()
+                uid = _peer_uid(connection)
+                if uid is not None and uid != os.getuid():
+                    connection.close()
+                    continue
+                self.preload()
+                if os.fork() == 0:
+                    listener.close()
+                    code = 1
+                    try:
+                        code = self._work(connection)
+                    except BaseException:
+                        traceback.print_exc()
+                    finally:
+                        os._exit(code)
+                connection.close()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+            os.unlink(self.socket_path)
+
+
+if __name__ == "__main__":
+    pass
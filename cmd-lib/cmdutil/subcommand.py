@@ -4,14 +4,62 @@ Base class for subcommands.
 """
 
 import argparse
+import collections.abc
 import sys
 
+from . import trace
+
+
+class SubcommandError(BaseException):
+    """
+    error reported by `Subcommand.error()`
+
+    Like `SystemExit`, which `error()` used to raise, it is not an
+    `Exception`, so broad `except Exception` handlers let it through.
+    """
+
+    def __init__(self, message, returncode=4):
+        super().__init__(message)
+        self.message = message
+        self.returncode = returncode
+
+
+def exit_code(system_exit):
+    """exit code of the process terminated by the `SystemExit` exception"""
+    code = system_exit.code
+    if code is None or isinstance(code, int):
+        return code or 0
+    print(code, file=sys.stderr)
+    return 1
+
+
+def record_field(record, field):
+    """`field` of the pipeline `record` (plain strings serve any field)"""
+    if field in [None, "*"] or isinstance(record, str):
+        return record
+    try:
+        return getattr(record, field)
+    except AttributeError:
+        message = f"record `{record}` has no field `{field}`"
+        print(message)
+        raise SubcommandError(message, returncode=2) from None
+
 
 class Subcommand(object):
     """
     Base class for subcommand.
+
+    A subcommand may take part in in-process pipelines (`cmd pipe`, see
+    `cmdutil.pipeline`): `produces` names the kind of records yielded by
+    `records()`, and `consumes` the field the subcommand reads from the
+    records of the upstream stage (available through `upstream_records()`
+    when running as a stage).
     """
 
+    consumes = None
+    produces = None
+    upstream = None
+
     def _description(self):
         description = self.module.__doc__ or ""
         if not description.strip():
@@ -56,15 +104,17 @@ class Subcommand(object):
         return parser
 
     def _parse(self, args, subcommand):
-        parser = self._create_parser(subcommand)
-        self.parser = self._configure_parser(parser)
+        with trace.span("parser"):
+            parser = self._create_parser(subcommand)
+            self.parser = self._configure_parser(parser)
         self.args = args[(2 if subcommand else 1) :]
-        unknown_args_name = getattr(self.parser, "unknown_args_name", None)
-        if unknown_args_name:
-            parsed, unknown = self.parser.parse_known_args(self.args)
-            setattr(parsed, unknown_args_name, unknown)
-        else:
-            parsed = self.parser.parse_args(self.args)
+        with trace.span("parse"):
+            unknown_args_name = getattr(self.parser, "unknown_args_name", None)
+            if unknown_args_name:
+                parsed, unknown = self.parser.parse_known_args(self.args)
+                setattr(parsed, unknown_args_name, unknown)
+            else:
+                parsed = self.parser.parse_args(self.args)
         return parsed
 
     def arguments_error(self, message):
@@ -73,17 +123,95 @@ class Subcommand(object):
 
     def error(self, message, returncode=4):
         print(message)
-        sys.exit(returncode)
+        raise SubcommandError(message, returncode)
 
     def validate_arguments(self):
         pass
 
-    def run(self, args, subcommand=None):
-        """entry point of the module (required callback)"""
+    def records(self):
+        """
+        yield records of the kind named by `produces`
+
+        Subcommands which declare `produces` (and thus can be upstream
+        pipeline stages) override this; the default reports an error.
+        """
+        self.error(f"`{type(self).__name__}` does not produce records")
+
+    def upstream_records(self):
+        """
+        values of the `consumes` field of upstream records
+
+        `None` if the subcommand is not fed by a pipeline stage.
+        """
+        if self.upstream is None:
+            return None
+        return (record_field(record, self.consumes) for record in self.upstream)
+
+    def _await(self, result):
+        """drive `result` of a coroutine `validate_arguments` / `execute`"""
+        if not isinstance(result, collections.abc.Awaitable):
+            return result
+        if self._runner is None:
+            from .aio import Runner
+
+            self._runner = Runner()
+        return self._runner.run(result)
+
+    def _start(self, args, subcommand):
+        self.failure = None
         self.module = sys.modules[self.__class__.__module__]
         self.arguments = self._parse(args, subcommand)
-        self.validate_arguments()
-        sys.exit(self.execute() or 0)
+        with trace.span("validate"):
+            self._await(self.validate_arguments())
+
+    def _stop(self):
+        if self._runner is not None:
+            self._runner.close()
+            self._runner = None
+
+    def prepare(self, args, subcommand=None):
+        """
+        parse and validate arguments without executing (pipeline stage)
+
+        Returns the exit code of a failure, or `None`.
+        """
+        self._runner = None
+        try:
+            self._start(args, subcommand)
+        except SubcommandError as e:
+            self.failure = e
+            return e.returncode
+        except SystemExit as e:
+            return exit_code(e)
+        finally:
+            self._stop()
+        return None
+
+    def call(self, args, subcommand=None):
+        """
+        run the subcommand, return its exit code instead of exiting
+
+        An error reported by `error()` / `arguments_error()` is kept in
+        `self.failure`. Coroutine `validate_arguments()` and `execute()`
+        are run on an event loop managed by the subcommand.
+        """
+        self._runner = None
+        try:
+            self._start(args, subcommand)
+            with trace.span("execute"):
+                returncode = self._await(self.execute())
+        except SubcommandError as e:
+            self.failure = e
+            return e.returncode
+        except SystemExit as e:
+            return exit_code(e)
+        finally:
+            self._stop()
+        return returncode or 0
+
+    def run(self, args, subcommand=None):
+        """entry point of the module (required callback)"""
+        sys.exit(self.call(args, subcommand))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Opt-in tracing of command phases.
+
+Tracing is enabled by the `CMD_TRACE` environment variable:
+
+* `CMD_TRACE=1` (or `stderr`) writes JSON lines to stderr;
+* `CMD_TRACE=‹path›.json` writes a Chrome trace (`chrome://tracing`,
+  Perfetto);
+* `CMD_TRACE=‹path›` appends JSON lines to the file, so the traces of
+  many invocations can be collected into one file and aggregated.
+
+`{pid}` in the path is replaced with the process id.
+
+Every event is a Chrome "complete" event (`"ph": "X"`) with wall start
+and duration in microseconds; `args.cpu_us` holds the CPU time of the
+phase. Besides the phases reported through `span()`, the execution time
+of every module imported while tracing is recorded (category `import`).
+"""
+
+import atexit
+import os
+import sys
+import time
+
+ENV_VARIABLE = "CMD_TRACE"
+
+_events = None
+_epoch_us = 0
+_epoch_ns = 0
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.wall = time.perf_counter_ns()
+        self.cpu = time.process_time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter_ns()
+        cpu = time.process_time_ns()
+        args = dict(self.args, cpu_us=(cpu - self.cpu) // 1000)
+        if exc_type is not None and exc_type is not SystemExit:
+            args["error"] = exc_type.__name__
+        _events.append(
+            {
+                "name": self.name,
+                "cat": self.category,
+                "ph": "X",
+                "ts": _epoch_us + (self.wall - _epoch_ns) // 1000,
+                "dur": (wall - self.wall) // 1000,
+                "pid": os.getpid(),
+                "tid": 0,
+                "args": args,
+            }
+        )
+        return False
+
+
+def enabled():
+    return _events is not None
+
+
+def span(name, category="phase", **args):
+    """context manager recording wall and CPU time of a phase"""
+    if _events is None:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+
+def _traced_exec_module(exec_module):
+    def traced(module):
+        with span(module.__spec__.name, "import"):
+            return exec_module(module)
+
+    traced.traced = True
+    return traced
+
+
+class _ImportTracer(object):
+    """
+    meta path finder timing `exec_module` of the modules found by others
+
+    A loader may be shared by many modules (a `zipimporter` loads all of
+    a bundle), so it is wrapped once, and spans are named after the
+    module being executed.
+    """
+
+    def find_spec(self, fullname, path=None, target=None):
+        finders = sys.meta_path[sys.meta_path.index(self) + 1 :]
+        for finder in finders:
+            find_spec = getattr(finder, "find_spec", None)
+            spec = find_spec(fullname, path, target) if find_spec else None
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        if loader is not None and not isinstance(loader, type):
+            exec_module = getattr(loader, "exec_module", None)
+            if exec_module is not None and not getattr(exec_module, "traced", False):
+                loader.exec_module = _traced_exec_module(exec_module)
+        return spec
+
+
+def _destination():
+    value = os.getenv(ENV_VARIABLE, "")
+    if value in ["", "0"]:
+        return None
+    if value in ["1", "stderr"]:
+        return "stderr"
+    return value.replace("{pid}", str(os.getpid()))
+
+
+def _write(destination, events):
+    import json  # only paid for when tracing
+
+    if destination.endswith(".json"):
+        text = json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+        mode = "w"
+    else:
+        text = "".join(json.dumps(event) + "\n" for event in events)
+        mode = "a"
+    if destination == "stderr":
+        sys.stderr.write(text)
+        sys.stderr.flush()
+        return
+    with open(destination, mode, encoding="utf-8") as f:
+        f.write(text)
+
+
+def _flush(destination, process_span):
+    process_span.__exit__(None, None, None)
+    events, _events[:] = list(_events), []
+    try:
+        _write(destination, events)
+    except OSError as e:
+        print(f"cannot write trace to `{destination}`: {e}", file=sys.stderr)
+
+
+def start():
+    """enable tracing if requested by `CMD_TRACE` (idempotent)"""
+    global _events, _epoch_us, _epoch_ns
+    destination = _destination()
+    if destination is None or _events is not None:
+        return
+    _events = []
+    _epoch_ns = time.perf_counter_ns()
+    _epoch_us = time.time_ns() // 1000
+    process_span = span("process", "process", argv=list(sys.argv)).__enter__()
+    sys.meta_path.insert(0, _ImportTracer())
+    atexit.register(_flush, destination, process_span)
+
+
+start()
+
+
+if __name__ == "__main__":
+    pass
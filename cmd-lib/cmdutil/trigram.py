@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Persistent trigram index of a tree of files (see `cmd grep --index`).
+
+The index maps every 3-byte sequence (ASCII lowercased) occurring in a
+file to the file, in an SQLite database. A regular expression which can
+only match text containing some literals can only match files containing
+all trigrams of those literals, so a search reads just these candidate
+files instead of the whole tree.
+
+`required_trigrams()` derives the trigrams from a compiled `bytes`
+pattern; a pattern without usable literals (like `a.c` or `\\w+`) yields
+`None`, and every file is a candidate. Files larger than `MAX_FILE_SIZE`,
+unreadable ones, and files beyond the `limit` of postings are recorded
+without trigrams and are always candidates; binary files never are.
+
+The index is updated incrementally: only files whose size, mtime or
+inode changed are read again, and files which disappeared are dropped.
+"""
+
+import array
+import os
+import re
+import sqlite3
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # before Python 3.11
+    import sre_parse
+
+from .walk import SNIFF_SIZE
+
+VERSION = 1
+MAX_FILE_SIZE = 8 << 20
+LIMIT = 50000000  # postings, about 10 bytes each
+MAX_QUERY = 256  # trigrams of an alternative looked up
+INDEXED, UNINDEXED, BINARY = range(3)
+ITEM = next(code for code in "IL" if array.array(code).itemsize == 4)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    signature TEXT NOT NULL,
+    state INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    trigram INTEGER NOT NULL,
+    file INTEGER NOT NULL,
+    PRIMARY KEY (trigram, file)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_file ON postings (file);
+"""
+
+
+def trigrams(data):
+    """
+    set of (integer encoded) trigrams of the ASCII lowercased lines of
+    `data`
+
+    Matches never span lines, so repeated lines are scanned once (and
+    trigrams across line ends are of no use, even if some are included).
+    """
+    data = data.lower()
+    if data.count(b"\n") > 1:
+        data = b"\n".join(set(data.split(b"\n")))
+    result = set()
+    for offset in range(3):
+        size = (len(data) - offset) // 3 * 3
+        if size <= 0:
+            continue
+        words = bytearray(size // 3 * 4)
+        words[1::4] = data[offset : offset + size : 3]
+        words[2::4] = data[offset + 1 : offset + size : 3]
+        words[3::4] = data[offset + 2 : offset + size : 3]
+        result.update(array.array(ITEM, bytes(words)))
+    return result
+
+
+def _signature(stat_result):
+    return f"{stat_result.st_size}:{stat_result.st_mtime_ns}:{stat_result.st_ino}"
+
+
+def file_trigrams(path, max_size=MAX_FILE_SIZE):
+    """`(signature, state, trigrams)` of the file at `path`"""
+    try:
+        stat_result = os.stat(path)
+        if stat_result.st_size > max_size:
+            return _signature(stat_result), UNINDEXED, None
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return "", UNINDEXED, None
+    if b"\0" in data[:SNIFF_SIZE]:
+        return _signature(stat_result), BINARY, None
+    return _signature(stat_result), INDEXED, trigrams(data)
+
+
+def _literal_runs(items):
+    """yield maximal runs of consecutive literal bytes in parsed `items`"""
+    run = bytearray()
+    for op, value in items:
+        if op is sre_parse.LITERAL:
+            run.append(value)
+            continue
+        if run:
+            yield bytes(run)
+            run = bytearray()
+    if run:
+        yield bytes(run)
+
+
+def _required(items):
+    """
+    trigrams any match of parsed `items` contains, as a list of
+    alternatives (sets, all trigrams of one are required); `None` if any
+    text may match
+    """
+    required = set()
+    for run in _literal_runs(items):
+        if len(run) >= 3:
+            required |= trigrams(run)
+    alternatives = None
+    for op, value in items:
+        if op is sre_parse.SUBPATTERN:
+            alternatives = _required(value[-1])
+        elif op is sre_parse.BRANCH:
+            branches = [_required(branch) for branch in value[1]]
+            if all(branch is not None for branch in branches):
+                alternatives = [a for branch in branches for a in branch]
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and value[0] >= 1:
+            alternatives = _required(value[2])
+        if alternatives is not None:
+            break  # one alternation is enough to narrow the candidates
+    if alternatives is None:
+        return [required] if required else None
+    return [required | alternative for alternative in alternatives]
+
+
+def required_trigrams(regex):
+    """
+    alternatives of trigram sets for the compiled `bytes` `regex`: a file
+    can match only if it contains all trigrams of one of them; `None` if
+    trigrams cannot narrow the search
+    """
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except (re.error, TypeError):
+        return None
+    alternatives = _required(list(parsed))
+    if not alternatives or not all(alternatives):
+        return None
+    return alternatives
+
+
+class TrigramIndex(object):
+    """trigram index of files (paths relative to the working directory)"""
+
+    def __init__(self, db_path, limit=LIMIT):
+        self.db_path = db_path
+        self.limit = limit
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript(SCHEMA)
+        version = self._meta("version")
+        if version != VERSION:
+            self.clear()
+
+    def _meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def clear(self):
+        with self.db:
+            self.db.execute("DELETE FROM postings")
+            self.db.execute("DELETE FROM files")
+            self.db.execute("DELETE FROM meta")
+            self.db.execute("INSERT INTO meta VALUES ('version', ?)", (VERSION,))
+        self.db.execute("VACUUM")
+
+    def close(self):
+        self.db.close()
+
+    def postings(self):
+        """number of `(trigram, file)` pairs in the index"""
+        return self._meta("postings") or 0
+
+    def update(self, paths, map_function):
+        """
+        bring the index up to date with the files at `paths`
+
+        `map_function(function, paths)` yields `(path, function(path))`
+        (possibly computed in parallel) of `file_trigrams`. Returns the
+        number of files read.
+        """
+        known = {
+            path: (file_id, signature)
+            for file_id, path, signature in self.db.execute(
+                "SELECT id, path, signature FROM files"
+            )
+        }
+        changed = []
+        for path in paths:
+            file_id, signature = known.pop(path, (None, None))
+            try:
+                current = _signature(os.stat(path))
+            except OSError:
+                current = ""
+            if current != signature or not current:
+                changed.append(path)
+        postings = self.postings()
+        with self.db:
+            for file_id, _ in known.values():  # gone
+                postings -= self._remove(file_id)
+            for path, (signature, state, file_trigrams) in map_function(changed):
+                row = self.db.execute(
+                    "SELECT id FROM files WHERE path = ?", (path,)
+                ).fetchone()
+                if row:
+                    postings -= self._remove(row[0])
+                if state == INDEXED and postings + len(file_trigrams) > self.limit:
+                    state = UNINDEXED
+                file_id = self.db.execute(
+                    "INSERT INTO files (path, signature, state) VALUES (?, ?, ?)",
+                    (path, signature, state),
+                ).lastrowid
+                if state == INDEXED:
+                    self.db.executemany(
+                        "INSERT INTO postings VALUES (?, ?)",
+                        ((trigram, file_id) for trigram in file_trigrams),
+                    )
+                    postings += len(file_trigrams)
+            self.db.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('postings', ?)", (postings,)
+            )
+        return len(changed)
+
+    def _remove(self, file_id):
+        removed = self.db.execute(
+            "DELETE FROM postings WHERE file = ?", (file_id,)
+        ).rowcount
+        self.db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        return removed
+
+    def candidates(self, alternatives):
+        """set of paths of files which may contain one of `alternatives`"""
+        paths = {
+            path
+            for path, in self.db.execute(
+                "SELECT path FROM files WHERE state = ?", (UNINDEXED,)
+            )
+        }
+        for alternative in alternatives:
+            alternative = sorted(alternative)[:MAX_QUERY]
+            query = (
+                "SELECT path FROM files WHERE id IN ("
+                " SELECT file FROM postings"
+                f" WHERE trigram IN ({', '.join('?' * len(alternative))})"
+                " GROUP BY file HAVING COUNT(*) = ?)"
+            )
+            rows = self.db.execute(query, list(alternative) + [len(alternative)])
+            paths.update(path for path, in rows)
+        return paths
+
+    def stats(self):
+        """`{name: value}` statistics of the index"""
+        states = dict(
+            self.db.execute("SELECT state, COUNT(*) FROM files GROUP BY state")
+        )
+        return {
+            "files": sum(states.values()),
+            "indexed": states.get(INDEXED, 0),
+            "unindexed": states.get(UNINDEXED, 0),
+            "binary": states.get(BINARY, 0),
+            "postings": self.postings(),
+            "limit": self.limit,
+            "size": os.path.getsize(self.db_path),
+        }
+
+
+if __name__ == "__main__":
+    pass
@@ -1,9 +1,20 @@
 #!/usr/bin/env python3
 
+import collections
+import fnmatch
+import functools
+import os
 import pathlib
+import re
 import subprocess
 import sys
 
+from . import gitdir
+from . import walk
+
+PROJECT_DEPTH = 16
+PROJECT_ENTRIES = 1000000
+
 
 def _exec(command, check):
     """
@@ -21,14 +32,125 @@ def _exec(command, check):
         return None
 
 
+@functools.lru_cache(maxsize=None)
+def _run_memoized(command, cwd):
+    complete = subprocess.run(command, stdout=subprocess.PIPE, encoding="utf-8")
+    return complete.returncode, complete.stdout[:-1]
+
+
+def _exec_memoized(command, check):
+    """
+    execute the `command` once per process and working directory.
+
+    See `_exec()`.
+    """
+    returncode, stdout = _run_memoized(tuple(command), os.getcwd())
+    if returncode == 0:
+        return stdout
+    elif check:
+        sys.exit(returncode)
+    else:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _repository(cwd):
+    try:
+        return gitdir.discover(cwd)
+    except (gitdir.Unsupported, OSError):
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _read_git(cwd, query):
+    """
+    result of `gitdir.Repository.<query>()` for `cwd`, read from `.git`
+    without running git
+
+    `None` if git has to be run instead (no repository, or anything
+    `gitdir` does not model, including errors git would report).
+    """
+    repository = _repository(cwd)
+    if repository is None:
+        return None
+    try:
+        return getattr(repository, query)()
+    except (gitdir.Unsupported, OSError):
+        return None
+
+
+def _stream(command, check, separator=b"\0"):
+    """
+    yield `separator`-terminated records of the `command` output, as the
+    command produces them
+
+    If `check` is True, the execution end if the command fails.
+    """
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    try:
+        rest = b""
+        for chunk in iter(lambda: process.stdout.read1(65536), b""):
+            records = (rest + chunk).split(separator)
+            rest = records.pop()
+            for record in records:
+                yield os.fsdecode(record)
+        if rest:
+            yield os.fsdecode(rest)
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.terminate()  # the consumer stopped early
+        returncode = process.wait()
+    if returncode != 0 and check:
+        sys.exit(returncode)
+
+
+async def _run_async(command):
+    """run the `command` without blocking the event loop"""
+    import asyncio  # slow to import, only for async subcommands
+
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, _ = await process.communicate()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    return process.returncode, stdout.decode("utf-8")
+
+
+async def _exec_async(command, check):
+    """
+    asynchronously execute the `command`.
+
+    See `_exec()`.
+    """
+    returncode, stdout = await _run_async(command)
+    if returncode == 0:
+        return stdout[:-1]
+    elif check:
+        sys.exit(returncode)
+    else:
+        return None
+
+
 def git_path(check=True):
     """
     locate git's root directory
 
     If `check` is True, the execution end if git root not found.
     Otherwise `None` is returned.
+
+    `git_path()`, `git_ref()` and `git_sha()` read `.git` directly where
+    they can (see `gitdir`), else run git; results are memoized per
+    process and working directory.
     """
-    path = _exec("git rev-parse --show-toplevel".split(), check)
+    path = _read_git(os.getcwd(), "toplevel")
+    if path is None:
+        path = _exec_memoized("git rev-parse --show-toplevel".split(), check)
     return pathlib.Path(path) if path else path
 
 
@@ -39,10 +161,13 @@ def git_ref(check=True):
     If `check` is True, the execution end if git root not found.
     Otherwise `None` is returned.
     """
-    branch = _exec("git rev-parse --abbrev-ref HEAD".split(), check)
+    ref = _read_git(os.getcwd(), "ref")
+    if ref is not None:
+        return ref
+    branch = _exec_memoized("git rev-parse --abbrev-ref HEAD".split(), check)
     if branch != "HEAD":
         return branch
-    tag_ref = _exec("git describe --all".split(), check)
+    tag_ref = _exec_memoized("git describe --all".split(), check)
     return tag_ref[5:] if tag_ref.startswith("tags/") else "HEAD"
 
 
@@ -53,7 +178,10 @@ def git_sha(check=True):
     If `check` is True, the execution end if git root not found.
     Otherwise `None` is returned.
     """
-    return _exec("git rev-parse HEAD".split(), check)
+    sha = _read_git(os.getcwd(), "sha")
+    if sha is not None:
+        return sha
+    return _exec_memoized("git rev-parse HEAD".split(), check)
 
 
 def git_dirty(check=True):
@@ -73,43 +201,200 @@ def git_dirty(check=True):
         return None
 
 
-def file_location(file_name, check=True):
+async def git_path_async(check=True):
     """
-    locate ancestor directory containing specified `file_name`
+    asynchronously locate git's root directory
 
-    If `check` is True, the execution end if git root not found.
-    Otherwise `None` is returned.
+    See `git_path()`.
+    """
+    path = _read_git(os.getcwd(), "toplevel")
+    if path is None:
+        path = await _exec_async("git rev-parse --show-toplevel".split(), check)
+    return pathlib.Path(path) if path else path
+
+
+async def git_ref_async(check=True):
+    """
+    asynchronously return name for current branch / tag
+
+    See `git_ref()`.
+    """
+    ref = _read_git(os.getcwd(), "ref")
+    if ref is not None:
+        return ref
+    branch = await _exec_async("git rev-parse --abbrev-ref HEAD".split(), check)
+    if branch != "HEAD":
+        return branch
+    tag_ref = await _exec_async("git describe --all".split(), check)
+    return tag_ref[5:] if tag_ref.startswith("tags/") else "HEAD"
+
+
+async def git_sha_async(check=True):
+    """
+    asynchronously return sha of current commit
+
+    See `git_sha()`.
+    """
+    sha = _read_git(os.getcwd(), "sha")
+    if sha is not None:
+        return sha
+    return await _exec_async("git rev-parse HEAD".split(), check)
+
+
+async def git_dirty_async(check=True):
     """
-    current = pathlib.Path.cwd()
-    while not (current / file_name).is_file():
-        if len(current.parts) == 1:
-            break
-        current = current.parent
-    if (current / file_name).is_file():
-        return current
+    asynchronously return dirty status of git
+
+    See `git_dirty()`.
+    """
+    return_code, _ = await _run_async("git diff-index --quiet HEAD --".split())
+    if return_code == 0:
+        return False
+    elif return_code == 1:
+        return True
     elif check:
-        print(f"expected file `{file_name}` not found")
-        sys.exit(4)
+        sys.exit(return_code)
     else:
         return None
 
 
-def project_location(file_name, check=True):
+def git_tracked_files(paths=(), check=True):
     """
-    Locate a minimal directory containing specified `file_name`
+    yield files tracked by git (relative to the current directory)
 
     If `check` is True, the execution end if git root not found.
-    Otherwise `None` is returned.
     """
-    current = pathlib.Path.cwd()
-    projects = current.glob("**/" + file_name)
-    while not list(projects) and len(current.parts) > 1:
-        current = current.parent
-        projects = current.glob("**/" + file_name)
-    if projects:
-        return current
-    elif check:
-        print(f"expected file `{file_name}` not found")
+    yield from _stream(["git", "ls-files", "-z", "--"] + list(paths), check)
+
+
+def git_changed_files(ref=None, paths=(), check=True):
+    """
+    yield files changed in the working tree since `ref`, or staged files
+    if `ref` is None (relative to the current directory, deleted files
+    excluded)
+
+    If `check` is True, the execution end if git root not found.
+    """
+    root = git_path(check)
+    if root is None:
+        return
+    command = "git diff --name-only -z --diff-filter=d".split()
+    command += ["--cached"] if ref is None else [ref]
+    pathspecs = list(paths) or ["."]  # like `git ls-files`: the current directory
+    for name in _stream(command + ["--"] + pathspecs, check):
+        yield os.path.relpath(os.path.join(root, name))  # git prints them from root
+
+
+def _markers(file_names):
+    """`file_names` (a name, or an iterable of names) as a tuple"""
+    return (file_names,) if isinstance(file_names, str) else tuple(file_names)
+
+
+def _not_found(markers, check):
+    if check:
+        names = " / ".join(f"`{marker}`" for marker in markers)
+        print(f"expected file {names} not found")
         sys.exit(4)
-    else:
-        return None
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _file_ancestor(start, markers):
+    current = start
+    while True:
+        if any(os.path.isfile(os.path.join(current, m)) for m in markers):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def file_location(file_name, check=True):
+    """
+    locate ancestor directory containing specified `file_name` (or any of
+    several names, if a list is given)
+
+    If `check` is True, the execution end if git root not found.
+    Otherwise `None` is returned.
+    """
+    markers = _markers(file_name)
+    location = _file_ancestor(os.getcwd(), markers)
+    if location is not None:
+        return pathlib.Path(location)
+    return _not_found(markers, check)
+
+
+def _name_matcher(markers):
+    """predicate of entry names matching any of `markers` (glob patterns)"""
+    literal = {marker for marker in markers if not walk.MAGIC.search(marker)}
+    patterns = [marker for marker in markers if walk.MAGIC.search(marker)]
+    if not patterns:
+        return literal.__contains__
+    pattern = re.compile("|".join(fnmatch.translate(p) for p in patterns))
+    return lambda name: name in literal or pattern.match(name) is not None
+
+
+@functools.lru_cache(maxsize=None)
+def _project_ancestor(start, markers, max_depth, max_entries):
+    """
+    nearest ancestor of `start` with an entry matching `markers` in its
+    tree, `None` if there is none (or `max_entries` were read)
+
+    The tree of `start` is searched breadth-first, then only the parts of
+    each ancestor's tree not searched yet, so no directory is read twice.
+    """
+    matches = _name_matcher(markers)
+    excluded = set(walk.EXCLUDED_DIRS)
+    remaining = max_entries
+    searched = None
+    current = start
+    while True:
+        queue = collections.deque([(current, 0)])
+        while queue:
+            directory, depth = queue.popleft()
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            remaining -= len(entries)
+            if remaining < 0:
+                return None
+            if any(matches(entry.name) for entry in entries):
+                return current
+            if depth == max_depth:
+                continue
+            for entry in entries:
+                if entry.path == searched or entry.name in excluded:
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        queue.append((entry.path, depth + 1))
+                except OSError:
+                    pass
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        searched, current = current, parent
+
+
+def project_location(
+    file_name, check=True, max_depth=PROJECT_DEPTH, max_entries=PROJECT_ENTRIES
+):
+    """
+    Locate a minimal directory containing specified `file_name` (or any of
+    several names or glob patterns, if a list is given) at any depth
+    below it, at most `max_depth` directories down
+
+    Excluded directories (`.git`, `node_modules`, ...) are not searched,
+    and the search gives up after reading `max_entries` directory entries.
+
+    If `check` is True, the execution end if git root not found.
+    Otherwise `None` is returned.
+    """
+    markers = _markers(file_name)
+    location = _project_ancestor(os.getcwd(), markers, max_depth, max_entries)
+    if location is not None:
+        return pathlib.Path(location)
+    return _not_found(markers, check)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Streaming file walker for subcommands working on trees of files.
+
+Directories are read with `os.scandir` one at a time, and their entries
+are yielded in sorted order as soon as the directory has been read, so
+processing starts with the first file instead of after the whole tree
+has been enumerated. Excluded directories (`.git`, `node_modules`, ...)
+are pruned without being entered, and so are paths matched by
+`.gitignore` files found in the walked tree. Hidden files (like with a
+glob `*`) and binary files (with a NUL byte in their first few KB) can be
+skipped.
+
+The `.gitignore` support is a subset: comments, negation (`!`),
+directory-only patterns (`dir/`), patterns anchored to their directory
+(containing a `/`), and glob wildcards matching within the path relative
+to the `.gitignore` (`*` may cross `/`). Ignore files outside of the
+walked tree, and global excludes, are not read.
+"""
+
+import fnmatch
+import glob
+import os
+import re
+
+EXCLUDED_DIRS = [".git", ".hg", ".svn", ".idea", "node_modules", "__pycache__"]
+GITIGNORE = ".gitignore"
+SNIFF_SIZE = 8192
+MAGIC = re.compile("[*?[]")
+
+
+def is_binary(path, size=SNIFF_SIZE):
+    """whether the file at `path` looks binary (has NUL in its beginning)"""
+    with open(path, "rb") as f:
+        return b"\0" in f.read(size)
+
+
+class IgnoreRules(object):
+    """`.gitignore` patterns in effect for a directory"""
+
+    def __init__(self, rules=()):
+        self.rules = tuple(rules)
+
+    @staticmethod
+    def _parse(directory, lines):
+        for line in lines:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            line = line.rstrip(" ")
+            negate = line.startswith("!")
+            if negate or line.startswith("\\"):
+                line = line[1:]
+            directory_only = line.endswith("/")
+            line = line.rstrip("/")
+            anchored = "/" in line
+            if not line:
+                continue
+            yield (directory, line.lstrip("/"), negate, directory_only, anchored)
+
+    def child(self, directory):
+        """rules of the `directory` (adding its `.gitignore`, if any)"""
+        try:
+            with open(os.path.join(directory, GITIGNORE), "r", errors="replace") as f:
+                lines = f.readlines()
+        except OSError:
+            return self
+        return IgnoreRules(self.rules + tuple(self._parse(directory, lines)))
+
+    def ignored(self, path, is_dir):
+        """whether `path` is ignored; the last matching pattern decides"""
+        ignored = False
+        name = os.path.basename(path)
+        for directory, pattern, negate, directory_only, anchored in self.rules:
+            if directory_only and not is_dir:
+                continue
+            if anchored:
+                relative = os.path.relpath(path, directory)
+                matched = fnmatch.fnmatchcase(relative, pattern)
+            else:
+                matched = fnmatch.fnmatchcase(name, pattern)
+            if matched:
+                ignored = not negate
+        return ignored
+
+
+class Walker(object):
+    def __init__(
+        self,
+        excluded_dirs=EXCLUDED_DIRS,
+        gitignore=True,
+        skip_binary=True,
+        recursive=True,
+        hidden=False,
+    ):
+        self.excluded_dirs = set(excluded_dirs)
+        self.gitignore = gitignore
+        self.skip_binary = skip_binary
+        self.recursive = recursive
+        self.hidden = hidden
+
+    def _accept(self, path):
+        if not self.skip_binary:
+            return True
+        try:
+            return not is_binary(path)
+        except OSError:
+            return True  # let the consumer report it
+
+    def walk(self, directory, rules=None):
+        """yield files under `directory`, sorted per directory"""
+        rules = rules or IgnoreRules()
+        if self.gitignore:
+            rules = rules.child(directory)
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            return
+        for entry in entries:
+            if not self.hidden and entry.name.startswith("."):
+                continue
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if rules.rules and rules.ignored(entry.path, is_dir):
+                continue
+            if is_dir:
+                if self.recursive and entry.name not in self.excluded_dirs:
+                    yield from self.walk(entry.path, rules)
+            elif self._accept(entry.path):
+                yield entry.path
+
+    def _pruned(self, path):
+        parts = os.path.normpath(path).split(os.sep)
+        return any(part in self.excluded_dirs for part in parts[:-1])
+
+    def expand(self, arguments):
+        """
+        yield files named by `arguments` (each yielded once)
+
+        A directory is walked, a glob pattern is expanded (matches in
+        excluded directories are dropped), and any other argument is
+        passed through, even if it does not exist.
+        """
+        seen = set()
+        for argument in arguments:
+            if os.path.isdir(argument):
+                paths = self.walk(argument)
+            elif MAGIC.search(argument):
+                paths = (
+                    path
+                    for path in sorted(glob.iglob(argument, recursive=True))
+                    if not self._pruned(path)
+                    and not os.path.isdir(path)
+                    and self._accept(path)
+                )
+            else:
+                paths = [argument]
+            for path in paths:
+                if path not in seen:
+                    seen.add(path)
+                    yield path
+
+
+if __name__ == "__main__":
+    pass